@@ -0,0 +1,153 @@
+"""Seeded generators of synthetic inputs for the hook benchmarks
+
+All generators take a random.Random instance, so the same seed always
+produces the same corpus.
+"""
+
+import os
+import subprocess
+
+WORDS = [
+    "the",
+    "firmware",
+    "build",
+    "image",
+    "with",
+    "for",
+    "and",
+    "release",
+    "platform",
+    "support",
+]
+NAMES = ["Zarhus", "zarhus", "Dasharo", "DASHARO", "coreboot", "Yocto", "UEFI"]
+DASHES = ["—", "–", "−", "‐", "‑", "﹘", "－"]
+
+
+def sentence(rng, words=12, name_density=0.1, extra=()):
+    vocabulary = WORDS + list(extra)
+    result = []
+    for _ in range(words):
+        if rng.random() < name_density:
+            result.append(rng.choice(NAMES))
+        else:
+            result.append(rng.choice(vocabulary))
+    return " ".join(result)
+
+
+def markdown(
+    rng,
+    lines=1000,
+    fence_density=0.02,
+    comment_density=0.02,
+    inline_density=0.1,
+    name_density=0.1,
+):
+    """Markdown text with code fences, HTML comments and inline code spans
+
+    Densities are probabilities of starting a fenced block or a comment on a
+    given line and of a line containing an inline code span.
+    """
+    output = ["# Benchmark document", ""]
+    while len(output) < lines:
+        roll = rng.random()
+        if roll < fence_density:
+            output.append("```bash")
+            output.extend(sentence(rng, 6, name_density) for _ in range(5))
+            output.append("```")
+        elif roll < fence_density + comment_density:
+            output.append("<!--")
+            output.extend(sentence(rng, 6, name_density) for _ in range(3))
+            output.append("-->")
+        elif rng.random() < inline_density:
+            code = sentence(rng, 2, name_density)
+            output.append(
+                f"{sentence(rng, 5, name_density)} `{code}` "
+                f"{sentence(rng, 5, name_density)}"
+            )
+        else:
+            output.append(sentence(rng, 12, name_density))
+    return "\n".join(output[:lines]) + "\n"
+
+
+def dashes(rng, lines=1000, dash_density=0.05):
+    """Text mixing ASCII with hyphen-like Unicode characters"""
+    output = []
+    for _ in range(lines):
+        words = sentence(rng, 12, 0).split()
+        for index in range(len(words)):
+            if rng.random() < dash_density:
+                words[index] += rng.choice(DASHES)
+        output.append(" ".join(words))
+    return "\n".join(output) + "\n"
+
+
+def mkdocs(rng, entries=1000, sections=4):
+    """mkdocs.yml with unsorted nav sections between sort markers"""
+    output = ["site_name: Benchmark", "nav:"]
+    per_section = max(1, entries // sections)
+    for section in range(sections):
+        output.append(f"  - Section {section}:")
+        output.append("    #pre-commit-sort-start")
+        for _ in range(per_section):
+            title = sentence(rng, 3, 0).title()
+            output.append(f"    - {title}: {title.lower().replace(' ', '-')}.md")
+        output.append("    #pre-commit-sort-end")
+    return "\n".join(output) + "\n"
+
+
+def write(path, content):
+    with open(path, "w", encoding="utf-8") as file:
+        file.write(content)
+    return path
+
+
+def git_repository(rng, path, commits=100, invalid_ratio=0.0):
+    """Repository with an 'origin' remote (a local bare repository, so
+    fetching works offline), a 'dasharo' base branch and commits on top"""
+    environment = dict(
+        os.environ,
+        GIT_AUTHOR_NAME="bench",
+        GIT_AUTHOR_EMAIL="bench@example.com",
+        GIT_COMMITTER_NAME="bench",
+        GIT_COMMITTER_EMAIL="bench@example.com",
+    )
+
+    def git(*args, cwd=path):
+        subprocess.run(
+            ["git", *args], cwd=cwd, env=environment, check=True, capture_output=True
+        )
+
+    origin = path + ".origin.git"
+    git("init", "-q", "--bare", origin, cwd=None)
+    git("init", "-q", "-b", "dasharo", path, cwd=None)
+    write(os.path.join(path, "README.md"), "# Benchmark\n")
+    git("add", "README.md")
+    git("commit", "-q", "-m", "Initial commit")
+    git("remote", "add", "origin", origin)
+    git("push", "-q", "origin", "dasharo")
+    # fast-import avoids spawning a process per commit
+    stream = []
+    for index in range(commits):
+        status = "Upstream-Status: Pending"
+        if rng.random() < invalid_ratio:
+            status = "Upstream-Status: Unknown"
+        message = f"Commit {index}\n\n{sentence(rng)}\n\n{status}\n"
+        data = message.encode()
+        stream.append(
+            b"commit refs/heads/dasharo\n"
+            b"committer bench <bench@example.com> 1700000000 +0000\n"
+            + f"data {len(data)}\n".encode()
+            + data
+            + (b"from refs/heads/dasharo^0\n" if index == 0 else b"")
+            + b"\n"
+        )
+    subprocess.run(
+        ["git", "fast-import", "--quiet", "--force"],
+        cwd=path,
+        env=environment,
+        input=b"".join(stream),
+        check=True,
+        capture_output=True,
+    )
+    git("reset", "-q", "--hard", "dasharo")
+    return path
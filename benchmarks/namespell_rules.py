@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""Measure how namespell matching cost scales with the number of rules
+
+Compares the previous approach (one pattern per rule, compiled for every line)
+with the single precompiled NameMatcher used by namespell.
+
+Usage:
+    python benchmarks/namespell_rules.py [--lines N] [--rules N [N ...]]
+"""
+
+import argparse
+import random
+import re
+import string
+import time
+
+from hooks import namespell
+
+WORDS = ["the", "firmware", "build", "image", "with", "for", "and", "release"]
+
+
+def generate_rules(count, rng):
+    rules = {}
+    while len(rules) < count:
+        name = "".join(rng.choices(string.ascii_letters, k=rng.randint(4, 10)))
+        rules[name] = name
+    return rules
+
+
+def generate_lines(count, names, rng):
+    lines = []
+    for _ in range(count):
+        words = rng.choices(WORDS, k=12)
+        words[rng.randrange(len(words))] = rng.choice(names).lower()
+        lines.append(" ".join(words) + "\n")
+    return lines
+
+
+def per_rule(rules, lines):
+    found = 0
+    for line in lines:
+        for name in rules:
+            pattern = re.compile(
+                rf"{namespell.NAME_BOUNDARY_BEFORE}{re.escape(name)}"
+                rf"{namespell.NAME_BOUNDARY_AFTER}",
+                re.IGNORECASE,
+            )
+            found += sum(1 for _ in pattern.finditer(line))
+    return found
+
+
+def combined(rules, lines):
+    matcher = namespell.NameMatcher(rules)
+    found = 0
+    for line in lines:
+        found += sum(1 for _ in matcher.finditer(line))
+    return found
+
+
+def measure(function, rules, lines):
+    start = time.perf_counter()
+    function(rules, lines)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="namespell rule scaling benchmark")
+    parser.add_argument("--lines", type=int, default=5000, help="Lines per run")
+    parser.add_argument(
+        "--rules",
+        type=int,
+        nargs="+",
+        default=[6, 25, 100, 400],
+        help="Rule counts to measure",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Corpus seed")
+    args = parser.parse_args()
+
+    print(f"{'rules':>8} {'per-rule [s]':>14} {'combined [s]':>14} {'speedup':>8}")
+    for count in args.rules:
+        rng = random.Random(args.seed)
+        rules = generate_rules(count, rng)
+        lines = generate_lines(args.lines, list(rules), rng)
+        old_time = measure(per_rule, rules, lines)
+        new_time = measure(combined, rules, lines)
+        print(
+            f"{count:>8} {old_time:>14.3f} {new_time:>14.3f} {old_time / new_time:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
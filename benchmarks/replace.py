@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""Compare strategies of replacing hyphen-like characters
+
+replace-hyphen-like fixes raw UTF-8 bytes with a single regular expression
+substitution, 3mdeb-hooks run fixes decoded text with one str.replace() pass
+per character present. This measures both strategies (and str.translate()
+for text) over the same seeded corpus, with several densities of
+hyphen-like characters.
+
+Usage:
+    python benchmarks/replace.py [--lines N] [--repeat N]
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import timeit
+
+import corpus
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+)
+
+from hooks.replace_hyphen_like import ENCODED_PATTERN, HYPHEN_LIKE  # noqa: E402
+
+TEXT_PATTERN = re.compile("|".join(map(re.escape, HYPHEN_LIKE)))
+TRANSLATION = str.maketrans({char: "-" for char in HYPHEN_LIKE})
+ENCODED = [char.encode("utf-8") for char in HYPHEN_LIKE]
+DENSITIES = (0.0, 0.001, 0.05, 0.5)
+
+
+def replace_passes(data, characters, hyphen):
+    # Same as replace_in_text()
+    for char in characters:
+        if char in data:
+            data = data.replace(char, hyphen)
+    return data
+
+
+def strategies(text, data):
+    return {
+        "bytes: replace passes": lambda: replace_passes(data, ENCODED, b"-"),
+        "bytes: pattern sub": lambda: ENCODED_PATTERN.sub(b"-", data),
+        "text: replace passes": lambda: replace_passes(text, HYPHEN_LIKE, "-"),
+        "text: pattern sub": lambda: TEXT_PATTERN.sub("-", text),
+        "text: translate": lambda: text.translate(TRANSLATION),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seed", type=int, default=0, help="Corpus seed")
+    parser.add_argument("--lines", type=int, default=20000, help="Corpus lines")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per strategy")
+    args = parser.parse_args()
+
+    print(f"{'density':>8} {'strategy':<24} {'time [ms]':>10}")
+    for density in DENSITIES:
+        text = corpus.dashes(random.Random(args.seed), args.lines, density)
+        data = text.encode("utf-8")
+        results = {}
+        for name, function in strategies(text, data).items():
+            results[name] = function()
+            seconds = min(timeit.repeat(function, number=1, repeat=args.repeat))
+            print(f"{density:>8} {name:<24} {seconds * 1000:>10.2f}")
+        # All strategies have to produce the same output
+        if (
+            len(
+                {
+                    result.encode("utf-8") if isinstance(result, str) else result
+                    for result in results.values()
+                }
+            )
+            != 1
+        ):
+            print("Error: strategies produced different output")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
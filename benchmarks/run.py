@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""Benchmark suite for the hooks
+
+Every hook runs in a separate process over a synthetic, seeded corpus (see
+corpus.py). For each benchmark the wall time, throughput and peak memory
+(maximum RSS) are measured, as well as the start up time of the hook on a
+trivial input. Results can be stored as baselines and later compared with
+them, failing if any metric regressed by more than a threshold. Everything
+runs offline.
+
+Usage:
+    python benchmarks/run.py                   # print results
+    python benchmarks/run.py --update          # store results as baselines
+    python benchmarks/run.py --check           # compare with baselines
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import corpus
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+SOURCE_DIR = os.path.join(os.path.dirname(BENCHMARKS_DIR), "src")
+BASELINES = os.path.join(BENCHMARKS_DIR, "baselines.json")
+
+# Metrics for which a higher value is a regression, throughput is checked
+# the other way around
+LOWER_IS_BETTER = ("seconds", "startup_seconds", "peak_rss_kb")
+
+
+# Runs a hook module like "python -m" would and stores its peak memory in
+# the file named by HOOKS_BENCH_RSS. ru_maxrss can't be used for that on
+# Linux, as it includes the memory of the (benchmark) process which spawned
+# the hook, while VmHWM only covers the hook process itself.
+RUNNER = """
+import atexit, os, runpy, sys
+
+def report():
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmHWM:"):
+                with open(os.environ["HOOKS_BENCH_RSS"], "w") as output:
+                    output.write(line.split()[1])
+
+if os.path.exists("/proc/self/status"):
+    atexit.register(report)
+sys.argv = sys.argv[1:]
+runpy.run_module(sys.argv[0], run_name="__main__", alter_sys=True)
+"""
+
+
+def run_hook(module, args, cwd):
+    """Run a hook, return (exit code, wall time, peak RSS in KB)"""
+    with tempfile.NamedTemporaryFile("r") as rss_file:
+        environment = dict(
+            os.environ, PYTHONPATH=SOURCE_DIR, HOOKS_BENCH_RSS=rss_file.name
+        )
+        start = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, "-c", RUNNER, f"hooks.{module}", *args],
+            cwd=cwd,
+            env=environment,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        _, status, usage = os.wait4(process.pid, 0)
+        elapsed = time.perf_counter() - start
+        # Like Popen.returncode, os.waitstatus_to_exitcode() needs Python 3.9
+        if os.WIFSIGNALED(status):
+            process.returncode = -os.WTERMSIG(status)
+        else:
+            process.returncode = os.WEXITSTATUS(status)
+        peak = rss_file.read().strip()
+    if peak:
+        return process.returncode, elapsed, int(peak)
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak = usage.ru_maxrss // 1024 if sys.platform == "darwin" else usage.ru_maxrss
+    return process.returncode, elapsed, peak
+
+
+class UnexpectedStatus(Exception):
+    """A hook exited with another code than its benchmark expects, so it most
+    likely failed and the measurements are meaningless"""
+
+
+class Benchmark:
+    """A hook invocation over a corpus, prepare() is called before every run
+    so hooks which modify their input always start from the same state
+
+    status and startup_status are the exit codes expected from the runs with
+    args() and startup_args(), hooks exit with 1 when they find (or fix)
+    problems in the corpus.
+    """
+
+    def __init__(self, name, module, unit, status=0, startup_status=0):
+        self.name = name
+        self.module = module
+        self.unit = unit
+        self.status = status
+        self.startup_status = startup_status
+
+    def setup(self, directory, rng, scale):
+        raise NotImplementedError
+
+    def prepare(self, directory):
+        pass
+
+    def args(self, directory):
+        raise NotImplementedError
+
+    def startup_args(self, directory):
+        raise NotImplementedError
+
+
+class Namespell(Benchmark):
+    def __init__(self):
+        # The corpus contains misspelled names
+        super().__init__("namespell", "namespell", "lines", status=1)
+
+    def setup(self, directory, rng, scale):
+        self.files = []
+        self.units = 0
+        for index in range(int(50 * scale)):
+            lines = rng.randint(100, 1000)
+            content = corpus.markdown(rng, lines)
+            path = os.path.join(directory, f"doc{index}.md")
+            self.files.append(corpus.write(path, content))
+            self.units += lines
+        self.empty = corpus.write(os.path.join(directory, "empty.md"), "")
+
+    def args(self, directory):
+        return ["--no-cache", *self.files]
+
+    def startup_args(self, directory):
+        return ["--no-cache", self.empty]
+
+
+class ReplaceHyphenLike(Benchmark):
+    def __init__(self):
+        # Files with hyphen-like characters are fixed
+        super().__init__(
+            "replace-hyphen-like", "replace_hyphen_like", "lines", status=1
+        )
+
+    def setup(self, directory, rng, scale):
+        self.sources = {}
+        self.units = 0
+        for index in range(int(50 * scale)):
+            lines = rng.randint(100, 1000)
+            # Most files in a documentation tree are plain ASCII
+            density = 0.05 if index % 10 == 0 else 0.0
+            self.sources[os.path.join(directory, f"doc{index}.md")] = corpus.dashes(
+                rng, lines, density
+            )
+            self.units += lines
+        self.empty = corpus.write(os.path.join(directory, "empty.md"), "")
+
+    def prepare(self, directory):
+        for path, content in self.sources.items():
+            corpus.write(path, content)
+
+    def args(self, directory):
+        return list(self.sources)
+
+    def startup_args(self, directory):
+        return [self.empty]
+
+
+class SortMkdocs(Benchmark):
+    def __init__(self):
+        # The navigation is sorted
+        super().__init__("sort-mkdocs", "sort_mkdocs", "entries", status=1)
+
+    def setup(self, directory, rng, scale):
+        self.units = int(20000 * scale)
+        self.content = corpus.mkdocs(rng, self.units)
+        self.path = os.path.join(directory, "mkdocs.yml")
+        self.small = corpus.write(
+            os.path.join(directory, "small.yml"), corpus.mkdocs(rng, 1, 1)
+        )
+
+    def prepare(self, directory):
+        corpus.write(self.path, self.content)
+
+    def args(self, directory):
+        return [self.path]
+
+    def startup_args(self, directory):
+        return [self.small]
+
+
+class CheckUpstreamStatus(Benchmark):
+    def __init__(self):
+        super().__init__("check-upstream-status", "check_upstream_status", "commits")
+
+    def setup(self, directory, rng, scale):
+        self.units = int(200 * scale)
+        self.repository = corpus.git_repository(
+            rng, os.path.join(directory, "repository"), self.units
+        )
+        self.small = corpus.git_repository(rng, os.path.join(directory, "small"), 1)
+
+    # Without --no-cache, repeated runs would only hit the valid commit cache
+    def args(self, directory):
+        return ["--no-cache", "--base", "origin/dasharo"]
+
+    def startup_args(self, directory):
+        return ["--no-cache", "--base", "origin/dasharo"]
+
+    def cwd(self, startup):
+        return self.small if startup else self.repository
+
+
+BENCHMARKS = [Namespell(), ReplaceHyphenLike(), SortMkdocs(), CheckUpstreamStatus()]
+
+
+def check_status(benchmark, status, expected, run):
+    if status != expected:
+        raise UnexpectedStatus(
+            f"{benchmark.name}: {run} run exited with {status}, expected {expected}"
+        )
+
+
+def measure(benchmark, directory, repeat):
+    """Best wall time and highest peak memory out of repeat runs, raises
+    UnexpectedStatus if a run exits with an unexpected code"""
+    cwd = getattr(benchmark, "cwd", lambda startup: directory)
+    seconds = startup = float("inf")
+    peak = 0
+    for _ in range(repeat):
+        benchmark.prepare(directory)
+        status, elapsed, rss = run_hook(
+            benchmark.module, benchmark.args(directory), cwd(False)
+        )
+        check_status(benchmark, status, benchmark.status, "main")
+        seconds = min(seconds, elapsed)
+        peak = max(peak, rss)
+        benchmark.prepare(directory)
+        status, elapsed, _ = run_hook(
+            benchmark.module, benchmark.startup_args(directory), cwd(True)
+        )
+        check_status(benchmark, status, benchmark.startup_status, "startup")
+        startup = min(startup, elapsed)
+    return {
+        "seconds": round(seconds, 4),
+        "throughput": round(benchmark.units / seconds, 1),
+        "unit": f"{benchmark.unit}/s",
+        "peak_rss_kb": peak,
+        "startup_seconds": round(startup, 4),
+    }
+
+
+def compare(results, baselines, threshold):
+    """Return descriptions of metrics worse than baseline * threshold"""
+    regressions = []
+    for name, metrics in results.items():
+        baseline = baselines.get(name)
+        if baseline is None:
+            continue
+        for metric in LOWER_IS_BETTER:
+            if metrics[metric] > baseline[metric] * threshold:
+                regressions.append(
+                    f"{name}: {metric} {metrics[metric]} > {baseline[metric]} (baseline)"
+                )
+        if metrics["throughput"] * threshold < baseline["throughput"]:
+            regressions.append(
+                f"{name}: throughput {metrics['throughput']} < "
+                f"{baseline['throughput']} (baseline)"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hooks benchmark suite")
+    parser.add_argument("--seed", type=int, default=0, help="Corpus seed")
+    parser.add_argument(
+        "--scale", type=float, default=1.0, help="Corpus size multiplier"
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per benchmark")
+    parser.add_argument(
+        "--only", nargs="+", metavar="HOOK", help="Run only selected benchmarks"
+    )
+    parser.add_argument("--baselines", default=BASELINES, help="Baselines file")
+    parser.add_argument(
+        "--update", action="store_true", help="Store results as baselines"
+    )
+    parser.add_argument(
+        "--check", action="store_true", help="Fail on regressions against baselines"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=1.5,
+        help="Allowed slowdown factor for --check (default: 1.5)",
+    )
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="hooks-bench-") as directory:
+        for benchmark in BENCHMARKS:
+            if args.only and benchmark.name not in args.only:
+                continue
+            workdir = os.path.join(directory, benchmark.module)
+            os.makedirs(workdir)
+            benchmark.setup(workdir, random.Random(args.seed), args.scale)
+            try:
+                results[benchmark.name] = measure(benchmark, workdir, args.repeat)
+            except UnexpectedStatus as e:
+                print(f"Error: {e}")
+                sys.exit(1)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(
+            f"{'benchmark':<24} {'time [s]':>10} {'throughput':>22} "
+            f"{'peak RSS [KB]':>14} {'startup [s]':>12}"
+        )
+        for name, metrics in results.items():
+            throughput = f"{metrics['throughput']} {metrics['unit']}"
+            print(
+                f"{name:<24} {metrics['seconds']:>10} {throughput:>22} "
+                f"{metrics['peak_rss_kb']:>14} {metrics['startup_seconds']:>12}"
+            )
+
+    if args.update:
+        baselines = {
+            "seed": args.seed,
+            "scale": args.scale,
+            "results": results,
+        }
+        with open(args.baselines, "w") as file:
+            json.dump(baselines, file, indent=2)
+            file.write("\n")
+
+    if args.check:
+        with open(args.baselines) as file:
+            baselines = json.load(file)
+        if (baselines["seed"], baselines["scale"]) != (args.seed, args.scale):
+            print("Error: baselines were measured with a different corpus")
+            sys.exit(1)
+        regressions = compare(results, baselines["results"], args.threshold)
+        if regressions:
+            print("\nRegressions:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("\nNo regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -16,59 +16,186 @@ errorCheck() {
 
 usage() {
 cat <<EOF
-Usage: ./$(basename "${0}") <command> <file>
-This script verifies the markdown file against our guidelines.
+Usage: ./$(basename "${0}") [-j <jobs>] <command> <file|directory>...
+This script verifies the markdown files against our guidelines.
+Directories are searched for *.md and *.markdown files. The git repository
+of the files (or their directory outside of repositories) is mounted once and
+all of its files are linted in a single container run, or in <jobs> parallel
+runs.
   Commands:
     check     run the linter
     fix       also try to fix some errors automatically
+  Options:
+    -j, --jobs <jobs>   number of containers run at once (default: 1)
 EOF
   exit 0
 }
 
 MARKDOWNLINT_CONTAINER="ghcr.io/igorshubovych/markdownlint-cli:v0.32.2"
 
-check() {
-  docker run \
-    -v "$CONFIG_DIR"/.markdownlint.yaml:/workdir/.markdownlint.yaml:ro \
-    -v "$FULL_PATH":/workdir/"$FILE_NAME":ro \
-    "$MARKDOWNLINT_CONTAINER" \
-    -c .markdownlint.yaml "$FILE_NAME"
+# Sets FILE_ROOT to the top level of the git repository containing a file,
+# or to its directory outside of repositories. Files are mounted through
+# their root, so nothing above a repository (e.g. / or $HOME) is mounted.
+declare -A DIR_ROOTS
+findRoot() {
+  local dir
+  dir="$(dirname "$1")"
+  if [ -z "${DIR_ROOTS[$dir]}" ]; then
+    DIR_ROOTS[$dir]="$(git -C "$dir" rev-parse --show-toplevel 2>/dev/null)"
+    [ -n "${DIR_ROOTS[$dir]}" ] || DIR_ROOTS[$dir]="$dir"
+  fi
+  FILE_ROOT="${DIR_ROOTS[$dir]}"
 }
 
-fix() {
-  docker run \
-    -v "$CONFIG_DIR"/.markdownlint.yaml:/workdir/.markdownlint.yaml:ro \
-    -v "$FULL_PATH":/workdir/"$FILE_NAME":rw \
+# Runs markdownlint over files given relative to the root (1st argument)
+lint() {
+  local root="$1"
+  local mode=ro
+  local args=()
+  shift
+  if [ "$CMD" = "fix" ]; then
+    mode=rw
+    args=(--fix)
+  fi
+  docker run --rm \
+    -v "$CONFIG_DIR"/.markdownlint.yaml:/config/.markdownlint.yaml:ro \
+    -v "$root":/workdir:"$mode" \
     "$MARKDOWNLINT_CONTAINER" \
-    -c .markdownlint.yaml --fix "$FILE_NAME"
+    -c /config/.markdownlint.yaml "${args[@]}" -- "$@"
+}
+
+# Lints the files of a batch (index)
+lintBatch() {
+  local files=()
+  mapfile -t files <<<"${BATCH_FILES[$1]%$'\n'}"
+  lint "${BATCH_ROOTS[$1]}" "${files[@]}"
 }
 
-CMD="$1"
-FILE="$2"
+JOBS=1
+PATHS=()
+while [ $# -gt 0 ]; do
+  case "$1" in
+    -j|--jobs)
+      JOBS="$2"
+      shift
+      ;;
+    -h|--help)
+      usage
+      ;;
+    *)
+      if [ -z "$CMD" ]; then
+        CMD="$1"
+      else
+        PATHS+=("$1")
+      fi
+      ;;
+  esac
+  shift
+done
 
 if [ -z "$CMD" ]; then
   echo "command not given"
   usage
 fi
 
-if [ -z "$FILE" ]; then
-  echo "file not given"
-  usage
-fi
-
-FULL_PATH="$(readlink -f "$FILE")"
-FILE_NAME="$(basename "$FULL_PATH")"
-
-
 case "$CMD" in
-    "check")
-      check
-        ;;
-    "fix")
-      fix
+    "check"|"fix")
         ;;
     *)
         echo "Invalid command: \"$CMD\""
         usage
         ;;
 esac
+
+if [ ${#PATHS[@]} -eq 0 ]; then
+  echo "file not given"
+  usage
+fi
+
+if ! [[ "$JOBS" =~ ^[1-9][0-9]*$ ]]; then
+  errorExit "Invalid number of jobs: \"$JOBS\""
+fi
+
+FILES=()
+for path in "${PATHS[@]}"; do
+  if [ -d "$path" ]; then
+    while IFS= read -r -d '' file; do
+      FILES+=("$(readlink -f "$file")")
+    done < <(find "$path" -name .git -prune -o -type f \
+      \( -name '*.md' -o -name '*.markdown' \) -print0 | sort -z)
+  elif [ -e "$path" ]; then
+    FILES+=("$(readlink -f "$path")")
+  else
+    errorExit "File not found: \"$path\""
+  fi
+done
+
+if [ ${#FILES[@]} -eq 0 ]; then
+  echo "No markdown files found"
+  exit 0
+fi
+
+# Files grouped by their roots, in the order the roots were found
+ROOTS=()
+declare -A ROOT_FILES
+for file in "${FILES[@]}"; do
+  findRoot "$file"
+  if [ -z "${ROOT_FILES[$FILE_ROOT]+set}" ]; then
+    ROOTS+=("$FILE_ROOT")
+    ROOT_FILES[$FILE_ROOT]=""
+  fi
+  ROOT_FILES[$FILE_ROOT]+="${file#"${FILE_ROOT%/}"/}"$'\n'
+done
+
+# Files of every root are distributed round-robin over up to JOBS batches
+BATCH_ROOTS=()
+BATCH_FILES=()
+for root in "${ROOTS[@]}"; do
+  mapfile -t RELATIVE <<<"${ROOT_FILES[$root]%$'\n'}"
+  SHARDS=$JOBS
+  if [ "$SHARDS" -gt ${#RELATIVE[@]} ]; then
+    SHARDS=${#RELATIVE[@]}
+  fi
+  for ((shard = 0; shard < SHARDS; shard++)); do
+    BATCH=""
+    for ((idx = shard; idx < ${#RELATIVE[@]}; idx += SHARDS)); do
+      BATCH+="${RELATIVE[idx]}"$'\n'
+    done
+    BATCH_ROOTS+=("$root")
+    BATCH_FILES+=("$BATCH")
+  done
+done
+
+if [ ${#BATCH_ROOTS[@]} -eq 1 ]; then
+  lintBatch 0
+  exit $?
+fi
+
+# Up to JOBS batches run at once, outputs are printed in batch order once
+# all of them finish
+OUTPUT_DIR="$(mktemp -d)"
+errorCheck "Failed to create a temporary directory"
+trap 'rm -rf "$OUTPUT_DIR"' EXIT
+RUNNING=0
+for ((batch = 0; batch < ${#BATCH_ROOTS[@]}; batch++)); do
+  if [ "$RUNNING" -ge "$JOBS" ]; then
+    wait -n
+    RUNNING=$((RUNNING - 1))
+  fi
+  (
+    lintBatch "$batch" >"$OUTPUT_DIR/$batch" 2>&1
+    echo $? >"$OUTPUT_DIR/$batch.status"
+  ) &
+  RUNNING=$((RUNNING + 1))
+done
+wait
+
+STATUS=0
+for ((batch = 0; batch < ${#BATCH_ROOTS[@]}; batch++)); do
+  cat "$OUTPUT_DIR/$batch"
+  BATCH_STATUS=$(cat "$OUTPUT_DIR/$batch.status")
+  if [ "$BATCH_STATUS" -gt "$STATUS" ]; then
+    STATUS=$BATCH_STATUS
+  fi
+done
+exit "$STATUS"
@@ -1,44 +1,205 @@
 #!/usr/bin/env python3
 
+import argparse
+import json
 import os
+import re
 import subprocess
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from shutil import copy2
+from typing import Dict, List, NamedTuple, Optional
+from urllib.parse import urlparse
 
 from jinja2 import Environment, FileSystemLoader
 
 # Define the valid categories
 valid_categories = {"markdown", "bash", "python", "robotframework", "yocto"}
 
+script_dir = os.path.dirname(os.path.abspath(__file__))
 
-def main(repo_path, categories):
-    # Navigate to the repository path
-    os.chdir(repo_path)
+TEMPLATE = "pre_commit_config.j2"
+# Hook revisions of all repositories in the template, written by
+# --refresh-lock and shared by all repositories initialized with --locked
+# instead of running autoupdate in each of them
+LOCKFILE = os.path.join(script_dir, "pre-commit-lock.json")
+LOCK_VERSION = 1
+REPO_LINE = re.compile(r"^\s*- repo:\s*(\S+)\s*$")
+REV_LINE = re.compile(r"^(\s*rev:\s*)(\S+)(.*)$")
+RELEASE_TAG = re.compile(r"^v?\d+(\.\d+)*$")
 
-    # Check if .pre-commit-config.yaml already exists
-    if os.path.exists(".pre-commit-config.yaml"):
-        should_continue = input(
-            ".pre-commit-config.yaml already exists. Do you want to continue? (y/N): "
-        )
-        if not should_continue.lower().startswith("y"):
-            sys.exit(1)
+# pre-commit commands run in every repository
+PRE_COMMIT_STEPS = [
+    ["pre-commit", "validate-config"],
+    ["pre-commit", "install"],
+    ["pre-commit", "autoupdate"],
+]
 
-    # Validate the input categories
+
+class StepResult(NamedTuple):
+    name: str
+    returncode: int
+    seconds: float
+    output: str
+
+
+class RepoResult(NamedTuple):
+    path: str
+    status: str
+    seconds: float
+    steps: List[StepResult]
+
+
+def check_categories(categories):
     for category in categories:
         if category not in valid_categories:
-            print(f"Error: Unknown hook category '{category}'")
-            sys.exit(1)
+            raise ValueError(f"Unknown hook category '{category}'")
+
+
+def render_config(categories, revs=None) -> str:
+    """Render pre_commit_config.j2 for the given categories
 
-    # Set up the Jinja2 environment and render the template
-    script_dir = os.path.dirname(os.path.abspath(__file__))
+    If revs (repository URL to revision) is given, revisions of these
+    repositories are pinned to it.
+    """
     env = Environment(
         loader=FileSystemLoader(script_dir),
         trim_blocks=True,
         lstrip_blocks=True,
     )
-    template = env.get_template("pre_commit_config.j2")
-    with open(".pre-commit-config.yaml", "w") as f:
-        f.write(template.render(categories=categories))
+    template = env.get_template(TEMPLATE)
+    config = template.render(categories=categories)
+    return config if revs is None else pin_revs(config, revs)
+
+
+def pin_revs(config, revs) -> str:
+    """Replace the rev of every '- repo: URL' entry found in revs"""
+    lines = config.splitlines(keepends=True)
+    repo = None
+    for idx, line in enumerate(lines):
+        match = REPO_LINE.match(line)
+        if match:
+            repo = match.group(1)
+            continue
+        match = REV_LINE.match(line)
+        if match and repo in revs:
+            prefix, _, suffix = match.groups()
+            ending = line[len(line.rstrip("\r\n")) :]
+            lines[idx] = f"{prefix}{revs[repo]}{suffix.rstrip()}{ending}"
+            repo = None
+    return "".join(lines)
+
+
+def template_repos() -> List[str]:
+    """URLs of all repositories in the template, regardless of categories"""
+    repos = []
+    with open(os.path.join(script_dir, TEMPLATE), "r") as f:
+        for line in f:
+            match = REPO_LINE.match(line)
+            # local and meta repositories have no revisions
+            if match and "://" in match.group(1) and match.group(1) not in repos:
+                repos.append(match.group(1))
+    return repos
+
+
+def tag_key(tag):
+    """Sort key comparing numbers in tags by value (v1.10.0 after v1.9.0)"""
+    # Numbers are always at odd indices, so only str is compared with str
+    # and int with int
+    return tuple(
+        int(part) if idx % 2 else part
+        for idx, part in enumerate(re.split(r"(\d+)", tag))
+    )
+
+
+def mirror_path(url, mirror_dir) -> str:
+    """Local mirror of url, <mirror_dir>/<host>/<path>[.git]"""
+    parsed = urlparse(url)
+    path = os.path.join(mirror_dir, parsed.netloc, parsed.path.strip("/"))
+    if not os.path.isdir(path) and os.path.isdir(path + ".git"):
+        return path + ".git"
+    return path
+
+
+def resolve_rev(url, mirror_dir=None) -> str:
+    """Latest tag of a repository, found without cloning it
+
+    Release tags (e.g. v1.2.3) are preferred, the latest pre-release tag is
+    used only if there are no releases. Raises RuntimeError if the tags
+    can't be listed.
+    """
+    remote = url if mirror_dir is None else mirror_path(url, mirror_dir)
+    process = subprocess.run(
+        ["git", "ls-remote", "--tags", "--refs", remote],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        env=dict(os.environ, GIT_TERMINAL_PROMPT="0"),
+    )
+    if process.returncode != 0:
+        raise RuntimeError(
+            f"Can't list tags of {remote}: {process.stderr.decode().strip()}"
+        )
+    tags = [
+        line.split("\trefs/tags/", 1)[1]
+        for line in process.stdout.decode().splitlines()
+        if "\trefs/tags/" in line
+    ]
+    if not tags:
+        raise RuntimeError(f"No tags found in {remote}")
+    releases = [tag for tag in tags if RELEASE_TAG.match(tag)]
+    return max(releases or tags, key=tag_key)
+
+
+def refresh_lock(path=LOCKFILE, mirror_dir=None, jobs=4) -> Dict[str, str]:
+    """Resolve revisions of all repositories in the template and store them"""
+    repos = template_repos()
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        revs = dict(
+            zip(repos, executor.map(lambda url: resolve_rev(url, mirror_dir), repos))
+        )
+    with open(path, "w") as f:
+        json.dump({"version": LOCK_VERSION, "repos": revs}, f, indent=2)
+        f.write("\n")
+    return revs
+
+
+def load_lock(path=LOCKFILE) -> Optional[Dict[str, str]]:
+    """Revisions from the lockfile, None if there is none
+
+    Raises ValueError if the lockfile has an unsupported version or is
+    missing repositories listed in the template.
+    """
+    try:
+        with open(path, "r") as f:
+            lock = json.load(f)
+    except FileNotFoundError:
+        return None
+    if lock.get("version") != LOCK_VERSION:
+        raise ValueError(
+            f"Unsupported lockfile version {lock.get('version')} in {path}, "
+            "refresh it with --refresh-lock"
+        )
+    revs = lock.get("repos", {})
+    missing = [url for url in template_repos() if url not in revs]
+    if missing:
+        raise ValueError(
+            f"{path} is missing {', '.join(missing)}, refresh it with --refresh-lock"
+        )
+    return revs
+
+
+def pre_commit_steps(locked):
+    """pre-commit commands to run, autoupdate isn't needed with a lockfile"""
+    if not locked:
+        return PRE_COMMIT_STEPS
+    return [command for command in PRE_COMMIT_STEPS if command[-1] != "autoupdate"]
+
+
+def install_config(repo_path, categories, config):
+    """Write the rendered config and copy configuration files to repo_path"""
+    with open(os.path.join(repo_path, ".pre-commit-config.yaml"), "w") as f:
+        f.write(config)
 
     # Install additional configuration files based on the selected categories
     copy2(os.path.join(script_dir, ".yamllint"), repo_path)
@@ -50,20 +211,256 @@ def main(repo_path, categories):
     if "yocto" in categories:
         copy2(os.path.join(script_dir, ".oelint-ruleset.json"), repo_path)
 
+
+def run_pre_commit(repo_path, steps=PRE_COMMIT_STEPS, capture=True):
+    """Run pre-commit commands in repo_path, output is collected if capture
+
+    A failed step doesn't stop the following ones, like in the interactive
+    mode.
+    """
+    results = []
+    for command in steps:
+        start = time.perf_counter()
+        try:
+            process = subprocess.run(
+                command,
+                cwd=repo_path,
+                stdout=subprocess.PIPE if capture else None,
+                stderr=subprocess.STDOUT if capture else None,
+            )
+        except OSError as e:
+            if not capture:
+                raise
+            results.append(
+                StepResult(command[-1], 127, time.perf_counter() - start, str(e))
+            )
+            continue
+        results.append(
+            StepResult(
+                command[-1],
+                process.returncode,
+                time.perf_counter() - start,
+                process.stdout.decode(errors="replace") if capture else "",
+            )
+        )
+    return results
+
+
+def init_repository(
+    repo_path, categories, config, force=False, steps=PRE_COMMIT_STEPS
+) -> RepoResult:
+    """Non-interactive initialization of a single repository"""
+    start = time.perf_counter()
+    if not os.path.isdir(repo_path):
+        return RepoResult(repo_path, "not found", 0.0, [])
+    if not force and os.path.exists(os.path.join(repo_path, ".pre-commit-config.yaml")):
+        return RepoResult(repo_path, "skipped", 0.0, [])
+    try:
+        install_config(repo_path, categories, config)
+    except OSError as e:
+        return RepoResult(repo_path, f"error: {e}", time.perf_counter() - start, [])
+    results = run_pre_commit(repo_path, steps)
+    failed = [step.name for step in results if step.returncode != 0]
+    status = f"failed: {', '.join(failed)}" if failed else "ok"
+    return RepoResult(repo_path, status, time.perf_counter() - start, results)
+
+
+def read_batch_file(path):
+    """(repo path, categories) from lines '<repo_path> <category>...'
+
+    Empty lines and lines starting with # are ignored, '-' reads stdin.
+    """
+    repositories = []
+    file = sys.stdin if path == "-" else open(path, "r")
+    with file:
+        for line in file:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            repo_path, *categories = line.split()
+            repositories.append((repo_path, categories))
+    return repositories
+
+
+def print_summary(results, steps=PRE_COMMIT_STEPS):
+    step_names = [command[-1] for command in steps]
+    width = max([len("repository")] + [len(result.path) for result in results])
+    header = f"{'repository':<{width}}  " + "".join(
+        f"{name:>16}" for name in step_names
+    )
+    print(f"\n{header}  {'total':>8}  result")
+    for result in results:
+        steps = {step.name: step for step in result.steps}
+        columns = "".join(
+            f"{steps[name].seconds:>15.1f}s" if name in steps else f"{'-':>16}"
+            for name in step_names
+        )
+        print(
+            f"{result.path:<{width}}  {columns}  {result.seconds:>7.1f}s  {result.status}"
+        )
+
+
+def batch(repositories, jobs=4, force=False, revs=None) -> bool:
+    """Initialize many repositories, returns True if all succeeded
+
+    The template is rendered once per distinct set of categories, pre-commit
+    commands of up to jobs repositories run at once. With revs (from the
+    lockfile) revisions are pinned and autoupdate isn't run.
+    """
+    steps = pre_commit_steps(revs is not None)
+    configs = {}
+    for repo_path, categories in repositories:
+        check_categories(categories)
+        key = frozenset(categories)
+        if key not in configs:
+            configs[key] = render_config(sorted(key), revs)
+
+    def init(repository):
+        repo_path, categories = repository
+        return init_repository(
+            repo_path, categories, configs[frozenset(categories)], force, steps
+        )
+
+    results = []
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        # Results are printed in input order, as soon as they're available
+        for result in executor.map(init, repositories):
+            print(f"{result.path}: {result.status}")
+            for step in result.steps:
+                if step.returncode != 0:
+                    print(step.output.rstrip())
+            results.append(result)
+    print_summary(results, steps)
+    return all(result.status in ("ok", "skipped") for result in results)
+
+
+def main(repo_path, categories, revs=None):
+    # Check if .pre-commit-config.yaml already exists
+    if os.path.exists(os.path.join(repo_path, ".pre-commit-config.yaml")):
+        should_continue = input(
+            ".pre-commit-config.yaml already exists. Do you want to continue? (y/N): "
+        )
+        if not should_continue.lower().startswith("y"):
+            sys.exit(1)
+
+    # Validate the input categories
+    try:
+        check_categories(categories)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    install_config(repo_path, categories, render_config(categories, revs))
+
     # Run pre-commit commands
-    subprocess.run(["pre-commit", "validate-config"])
-    subprocess.run(["pre-commit", "install"])
-    subprocess.run(["pre-commit", "autoupdate"])
+    run_pre_commit(repo_path, pre_commit_steps(revs is not None), capture=False)
 
 
-if __name__ == "__main__":
-    # Display help message if no or incorrect arguments are given
-    if len(sys.argv) < 3:
-        print("Usage: python3 script.py <repo_path> <categories>")
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Set up pre-commit hooks in repositories",
+        epilog=f"Categories: {', '.join(sorted(valid_categories))}",
+    )
+    parser.add_argument("repo_path", nargs="?", help="Repository to set up")
+    parser.add_argument(
+        "categories", nargs="?", help="Space-separated list of hook categories"
+    )
+    parser.add_argument(
+        "--batch",
+        metavar="FILE",
+        help="Set up all repositories listed in FILE ('-' for stdin) without "
+        "asking, one '<repo_path> <category>...' per line",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=4,
+        help="With --batch, number of repositories set up at once (default: 4)",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        default=False,
+        help="With --batch, overwrite existing configurations instead of "
+        "skipping these repositories",
+    )
+    parser.add_argument(
+        "--lockfile",
+        default=LOCKFILE,
+        metavar="FILE",
+        help="Lockfile used by --locked and --refresh-lock (default: "
+        "pre-commit-lock.json next to this script)",
+    )
+    parser.add_argument(
+        "--locked",
+        action="store_true",
+        default=False,
+        help="Pin hook revisions to the lockfile instead of running pre-commit "
+        "autoupdate",
+    )
+    parser.add_argument(
+        "--refresh-lock",
+        action="store_true",
+        default=False,
+        help="Resolve the latest revisions of all hook repositories and write "
+        "them to the lockfile",
+    )
+    parser.add_argument(
+        "--mirror-dir",
+        metavar="DIR",
+        help="With --refresh-lock, read tags from local mirrors "
+        "DIR/<host>/<path> instead of the repository URLs",
+    )
+    args = parser.parse_args()
+    if args.refresh_lock:
+        if args.batch is not None or args.repo_path is not None or args.locked:
+            parser.error(
+                "--refresh-lock can't be used with repo_path, --batch or --locked"
+            )
+        return args
+    if args.batch is None and args.categories is None:
+        parser.print_usage()
         print(f"Categories: {valid_categories}")
         sys.exit(1)
+    if args.batch is not None and args.repo_path is not None:
+        parser.error("--batch can't be used with repo_path")
+    if args.jobs < 1:
+        parser.error("--jobs has to be a positive number")
+    return args
+
 
-    # Expecting the repo path as the first argument and a space-separated list of categories as the second
-    repo_path = sys.argv[1]
-    categories = sys.argv[2].split()
-    main(repo_path, categories)
+if __name__ == "__main__":
+    args = parse_args()
+    if args.refresh_lock:
+        try:
+            revs = refresh_lock(args.lockfile, args.mirror_dir, args.jobs)
+        except (OSError, RuntimeError) as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        for url, rev in revs.items():
+            print(f"{url}: {rev}")
+        sys.exit(0)
+    revs = None
+    if args.locked:
+        try:
+            revs = load_lock(args.lockfile)
+        except (OSError, ValueError) as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        if revs is None:
+            print(
+                f"Error: {args.lockfile} doesn't exist, create it with --refresh-lock"
+            )
+            sys.exit(1)
+    if args.batch is None:
+        # Expecting the repo path as the first argument and a space-separated list of categories as the second
+        main(args.repo_path, args.categories.split(), revs)
+    else:
+        try:
+            repositories = read_batch_file(args.batch)
+            passed = batch(repositories, args.jobs, args.force, revs)
+        except (OSError, ValueError) as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        sys.exit(0 if passed else 1)
@@ -0,0 +1,100 @@
+"""On-disk cache of files already known to pass a check
+
+Entries are empty files named after a digest of the file content, stored in
+a directory specific to a fingerprint of everything else the result depends
+on (rules, configuration, tool version). Changing any of these moves the
+cache to a new directory, stale directories are removed on the next prune.
+"""
+
+import hashlib
+import os
+import shutil
+
+CHUNK_SIZE = 1 << 16
+
+
+def package_version() -> str:
+    # Imported only when needed, it noticeably slows down the start up
+    from importlib import metadata
+
+    try:
+        return metadata.version("3mdeb-hooks")
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def config_fingerprint(*parts) -> str:
+    """Digest of the repr() of all parts, which have to be deterministic"""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        digest.update(repr(part).encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def init_cache_dir(directory):
+    """Create a cache directory which is ignored by git"""
+    os.makedirs(directory, exist_ok=True)
+    gitignore = os.path.join(directory, ".gitignore")
+    if not os.path.exists(gitignore):
+        with open(gitignore, "w") as file:
+            file.write("*\n")
+
+
+class ResultCache:
+    def __init__(self, directory, fingerprint, max_entries=20000):
+        self.root = directory
+        self.directory = os.path.join(directory, fingerprint)
+        self.max_entries = max_entries
+        self.added = 0
+
+    def file_key(self, filename, salt="") -> str:
+        """Digest of salt and the file content, read in fixed size chunks"""
+        digest = hashlib.blake2b(salt.encode(), digest_size=20)
+        with open(filename, "rb") as file:
+            for chunk in iter(lambda: file.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def contains(self, key) -> bool:
+        path = os.path.join(self.directory, key)
+        try:
+            # Refresh the entry so the eviction drops the least recently
+            # used ones first
+            os.utime(path)
+        except OSError:
+            return False
+        return True
+
+    def add(self, key):
+        try:
+            init_cache_dir(self.root)
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, key), "w"):
+                pass
+        except OSError:
+            # The cache is only an optimization, never fail the check on it
+            return
+        self.added += 1
+
+    def prune(self):
+        """Remove stale cache directories and the oldest excess entries"""
+        try:
+            with os.scandir(self.root) as entries:
+                for entry in entries:
+                    if entry.is_dir() and entry.path != self.directory:
+                        shutil.rmtree(entry.path, ignore_errors=True)
+            with os.scandir(self.directory) as entries:
+                files = [(entry.stat().st_mtime, entry.path) for entry in entries]
+        except OSError:
+            return
+        excess = len(files) - self.max_entries
+        if excess <= 0:
+            return
+        # Evict down to 90% of the limit to not prune on every run
+        excess += self.max_entries // 10
+        for _, path in sorted(files)[:excess]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
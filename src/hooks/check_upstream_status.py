@@ -2,10 +2,14 @@
 
 
 import argparse
+import os
 import re
 import subprocess
 import sys
 
+from hooks.cache import config_fingerprint
+from hooks.stats import add_arguments, instrument, measure
+
 # Valid Upstream-Status patterns
 UPSTREAM_STATUS_PATTERNS = [
     r"^Upstream-Status:\s+Backport\s+\[.+\]$",
@@ -15,50 +19,370 @@ UPSTREAM_STATUS_PATTERNS = [
 ]
 
 
-def get_commit_range(base_ref="origin/dasharo", debug=False):
-    """Get the list of commits from base_ref (branch or commit) to HEAD."""
-    try:
+# All patterns in one expression, each in a named group to tell which one
+# matched
+UPSTREAM_STATUS_PATTERN = re.compile(
+    "|".join(
+        f"(?P<pattern{idx}>{pattern})"
+        for idx, pattern in enumerate(UPSTREAM_STATUS_PATTERNS)
+    )
+)
+CHUNK_SIZE = 1 << 16
+# Separates fields of a commit in the git log output, commits are separated
+# by NUL
+FIELD_SEPARATOR = "\x1f"
+# Directory (in the git directory) of the cache of valid commits
+CACHE_DIR = "upstream-status-cache"
+FETCH_MODES = ["always", "missing", "never"]
+
+
+def ref_exists(ref) -> bool:
+    return (
+        subprocess.run(
+            ["git", "rev-parse", "--verify", "--quiet", f"{ref}^{{commit}}"],
+            stdout=subprocess.DEVNULL,
+        ).returncode
+        == 0
+    )
+
+
+def fetch_origin(fetch="always", refs=()):
+    """Fetch origin if fetch is "always", or "missing" and any ref is missing"""
+    if fetch == "always" or (fetch == "missing" and not all(map(ref_exists, refs))):
         subprocess.run(
             ["git", "fetch", "origin"], check=True, stdout=subprocess.DEVNULL
         )
+
+
+def get_merge_base(base_ref="origin/dasharo", debug=False, fetch="always", head="HEAD"):
+    """Get the merge base of base_ref (branch or commit) and head.
+
+    origin is fetched first if fetch is "always", or if it's "missing" and
+    base_ref doesn't exist locally.
+    """
+    try:
+        fetch_origin(fetch, [base_ref])
         merge_base = (
-            subprocess.check_output(["git", "merge-base", "HEAD", base_ref])
+            subprocess.check_output(["git", "merge-base", head, base_ref])
             .strip()
             .decode()
         )
-        commits = (
-            subprocess.check_output(["git", "rev-list", f"{merge_base}..HEAD"])
-            .decode()
-            .splitlines()
-        )
         if debug:
             print(f"[DEBUG] Base ref: {base_ref}")
             print(f"[DEBUG] Merge base: {merge_base}")
-            print(f"[DEBUG] Commits to check ({len(commits)}): {commits}")
-        return commits
+        return merge_base
     except subprocess.CalledProcessError as e:
         print("Error getting commit range:", e, file=sys.stderr)
         sys.exit(1)
 
 
-def has_valid_upstream_status(commit_hash, debug=False):
-    """Check if commit contains a valid Upstream-Status line."""
-    try:
-        message = subprocess.check_output(
-            ["git", "log", "--format=%B", "-n", "1", commit_hash]
-        ).decode()
+def __parse_commit(record):
+    commit_hash, subject, message = record.decode("utf8", errors="replace").split(
+        FIELD_SEPARATOR, 2
+    )
+    return commit_hash, subject, message
+
+
+def iter_commits(revision_range=None, commits=None):
+    """Yield (hash, subject, message) of all commits in revision_range
+
+    If commits (a list of hashes) are given instead, only these are read, in
+    the same order. Everything is read from a single git log process, its
+    output is parsed as it arrives, so only one chunk of it is kept in memory
+    at a time.
+    """
+    command = [
+        "git",
+        "log",
+        "-z",
+        f"--format=%H{FIELD_SEPARATOR}%s{FIELD_SEPARATOR}%B",
+    ]
+    if commits is None:
+        command += [revision_range, "--"]
+    else:
+        command += ["--no-walk=unsorted", "--stdin"]
+    stdin = subprocess.DEVNULL if commits is None else subprocess.PIPE
+    with subprocess.Popen(command, stdin=stdin, stdout=subprocess.PIPE) as process:
+        if commits is not None:
+            # git reads all revisions before writing anything
+            process.stdin.write("".join(f"{commit}\n" for commit in commits).encode())
+            process.stdin.close()
+        buffer = b""
+        for chunk in iter(lambda: process.stdout.read(CHUNK_SIZE), b""):
+            *records, buffer = (buffer + chunk).split(b"\0")
+            for record in records:
+                yield __parse_commit(record)
+        if buffer:
+            yield __parse_commit(buffer)
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, command)
+
+
+class ValidCommitCache:
+    """Hashes of commits already found valid, kept in the git directory
+
+    Commits are immutable, so their results only depend on the patterns.
+    Every set of UPSTREAM_STATUS_PATTERNS has its own file, files of other
+    sets are removed on save.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.path = os.path.join(
+            directory, config_fingerprint(UPSTREAM_STATUS_PATTERNS)
+        )
+        self.hashes = set()
+        self.added = []
+        try:
+            with open(self.path, "r") as file:
+                self.hashes.update(line.strip() for line in file)
+        except OSError:
+            pass
+
+    @classmethod
+    def open(cls):
+        directory = (
+            subprocess.check_output(["git", "rev-parse", "--git-path", CACHE_DIR])
+            .decode()
+            .strip()
+        )
+        return cls(directory)
+
+    def __contains__(self, commit_hash):
+        return commit_hash in self.hashes
+
+    def add(self, commit_hash):
+        self.hashes.add(commit_hash)
+        self.added.append(commit_hash)
+
+    def save(self):
+        if not self.added:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    if entry.path != self.path:
+                        os.remove(entry.path)
+            with open(self.path, "a") as file:
+                file.writelines(f"{commit_hash}\n" for commit_hash in self.added)
+        except OSError:
+            # The cache is only an optimization, never fail the check on it
+            pass
+        self.added = []
+
+
+def has_valid_upstream_status(message, debug=False, stats=None):
+    """Check if commit message contains a valid Upstream-Status line."""
+    if stats is not None:
+        stats.bytes = len(message.encode())
+    for line in message.splitlines():
+        if stats is not None:
+            stats.lines += 1
         if debug:
-            print(f"\n[DEBUG] Commit: {commit_hash}\n{message.strip()}\n{'-' * 40}")
-        for line in message.splitlines():
+            print(f"[DEBUG] Checking line: {repr(line.strip())}")
+        match = UPSTREAM_STATUS_PATTERN.match(line.strip())
+        if match:
+            if stats is not None:
+                pattern = UPSTREAM_STATUS_PATTERNS[int(match.lastgroup[7:])]
+                stats.matches[pattern] += 1
+            return True
+    return False
+
+
+def ref_pair_type(value):
+    """argparse type for REF:BASE pairs"""
+    ref, _, base = value.partition(":")
+    if not ref or not base:
+        raise argparse.ArgumentTypeError(f"expected REF:BASE, got '{value}'")
+    return ref, base
+
+
+def validate_commits(
+    revision_range=None, commits=None, cache=None, debug=False, stats=None
+):
+    """Check messages of commits like iter_commits reads them
+
+    Valid commits are added to cache (if given). Returns a list of (hash,
+    title) of commits without a valid tag, in the order they were read.
+    """
+    failed_commits = []
+    checked = 0
+    if commits != []:
+        for commit, title, message in iter_commits(revision_range, commits):
+            checked += 1
             if debug:
-                print(f"[DEBUG] Checking line: {repr(line.strip())}")
-            for pattern in UPSTREAM_STATUS_PATTERNS:
-                if re.match(pattern, line.strip()):
-                    return True
-        return False
+                print(f"\n[DEBUG] Commit: {commit}\n{message.strip()}\n{'-' * 40}")
+            with measure(stats, commit) as commit_stats:
+                if has_valid_upstream_status(message, debug, commit_stats):
+                    if cache is not None:
+                        cache.add(commit)
+                else:
+                    failed_commits.append((commit, title))
+    if debug:
+        print(f"[DEBUG] Checked commits: {checked}")
+    return failed_commits
+
+
+def walk_ranges(ranges):
+    """Commits of many (tip, merge base) ranges, found in one revision walk
+
+    Walks from all tips down to the common ancestor of all merge bases once,
+    then splits the commit graph per range. Returns a list of commits of
+    every range, in the order of the walk.
+    """
+    merge_bases = sorted({merge_base for _, merge_base in ranges})
+    bottom = []
+    if merge_bases:
+        process = subprocess.run(
+            ["git", "merge-base", "--octopus", *merge_bases],
+            stdout=subprocess.PIPE,
+        )
+        # Unrelated histories have no common ancestor, walk them whole
+        bottom = process.stdout.decode().split()
+    output = subprocess.check_output(
+        [
+            "git",
+            "rev-list",
+            "--parents",
+            *sorted({tip for tip, _ in ranges}),
+            "--not",
+            *bottom,
+            "--",
+        ]
+    ).decode()
+    # Commit -> parents, in the order of the walk
+    parents = {}
+    for line in output.splitlines():
+        commit, *commit_parents = line.split()
+        parents[commit] = commit_parents
+
+    def reachable(start, excluded=frozenset()):
+        """Commits of the walked graph reachable from start"""
+        found = set()
+        stack = [start]
+        while stack:
+            commit = stack.pop()
+            if commit in found or commit in excluded or commit not in parents:
+                continue
+            found.add(commit)
+            stack.extend(parents[commit])
+        return found
+
+    order = {commit: idx for idx, commit in enumerate(parents)}
+    results = []
+    for tip, merge_base in ranges:
+        commits = reachable(tip, reachable(merge_base))
+        results.append(sorted(commits, key=order.__getitem__))
+    return results
+
+
+def print_expected_format():
+    print("\nExpected format examples:")
+    print("  Upstream-Status: Backport [CB:86758]")
+    print("  Upstream-Status: Inappropriate [Dasharo downstream]")
+    print("  Upstream-Status: Pending")
+    print("  Upstream-Status: Submitted [CB:86758]")
+
+
+def check_commits(args, stats=None):
+    """Check commits of HEAD since its merge base with --base"""
+    merge_base = get_merge_base(args.base, args.debug, args.fetch)
+    revision_range = f"{merge_base}..HEAD"
+
+    try:
+        cache = None if args.no_cache else ValidCommitCache.open()
+        commits = None
+        if cache is not None and cache.hashes:
+            # Only read messages of commits not known to be valid
+            in_range = (
+                subprocess.check_output(["git", "rev-list", revision_range, "--"])
+                .decode()
+                .split()
+            )
+            commits = [commit for commit in in_range if commit not in cache]
+            if stats is not None:
+                for commit in in_range:
+                    if commit in cache:
+                        stats.skip(commit, "cached")
+        # (hash, title) of commits without a valid tag
+        failed_commits = validate_commits(
+            revision_range, commits, cache, args.debug, stats
+        )
+    except subprocess.CalledProcessError as e:
+        print("Error reading commits:", e, file=sys.stderr)
+        sys.exit(1)
+    if cache is not None:
+        cache.save()
+
+    if failed_commits:
+        print(
+            "\n❌ The following commits are missing or have invalid 'Upstream-Status':\n"
+        )
+        for fc, title in failed_commits:
+            print(f"  - {fc}: {title}")
+        print_expected_format()
+        sys.exit(1)
+    else:
+        print("✅ All commits contain a valid 'Upstream-Status' tag.")
+
+
+def check_refs(args, stats=None):
+    """Check commits of all REF:BASE pairs, each unique commit once"""
+    try:
+        fetch_origin(args.fetch, [ref for pair in args.refs for ref in pair])
+        tips = []
+        for ref, base in args.refs:
+            tip = (
+                subprocess.check_output(
+                    ["git", "rev-parse", "--verify", f"{ref}^{{commit}}"]
+                )
+                .decode()
+                .strip()
+            )
+            tips.append((tip, get_merge_base(base, args.debug, "never", tip)))
+        ranges = walk_ranges(tips)
+        unique = list(dict.fromkeys(commit for commits in ranges for commit in commits))
+        cache = None if args.no_cache else ValidCommitCache.open()
+        to_check = unique
+        if cache is not None:
+            to_check = [commit for commit in unique if commit not in cache]
+            if stats is not None:
+                for commit in unique:
+                    if commit in cache:
+                        stats.skip(commit, "cached")
+        if args.debug:
+            print(f"[DEBUG] Unique commits: {len(unique)}, to check: {len(to_check)}")
+        failed = dict(
+            validate_commits(
+                commits=to_check, cache=cache, debug=args.debug, stats=stats
+            )
+        )
     except subprocess.CalledProcessError as e:
-        print(f"Error reading commit {commit_hash}:", e, file=sys.stderr)
-        return False
+        print("Error reading commits:", e, file=sys.stderr)
+        sys.exit(1)
+    if cache is not None:
+        cache.save()
+
+    any_failed = False
+    for (ref, base), commits in zip(args.refs, ranges):
+        failed_commits = [commit for commit in commits if commit in failed]
+        if not failed_commits:
+            print(
+                f"✅ {ref} ({len(commits)} commits since {base}): "
+                "all commits contain a valid 'Upstream-Status' tag."
+            )
+            continue
+        any_failed = True
+        print(
+            f"\n❌ {ref} ({len(commits)} commits since {base}): the following "
+            "commits are missing or have invalid 'Upstream-Status':\n"
+        )
+        for commit in failed_commits:
+            print(f"  - {commit}: {failed[commit]}")
+    if any_failed:
+        print_expected_format()
+        sys.exit(1)
 
 
 def main():
@@ -71,40 +395,42 @@ def main():
         default="origin/dasharo",
         help="Base branch or commit to compare against (default: origin/dasharo)",
     )
+    parser.add_argument(
+        "--fetch",
+        choices=FETCH_MODES,
+        default="always",
+        help="When to fetch origin before checking: always (default), only if "
+        "the base ref is missing locally, or never",
+    )
+    parser.add_argument(
+        "--no-fetch",
+        dest="fetch",
+        action="store_const",
+        const="never",
+        help="Don't fetch origin, same as --fetch never",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        default=False,
+        help="Check all commits, even those found valid in previous runs",
+    )
+    parser.add_argument(
+        "--refs",
+        nargs="+",
+        type=ref_pair_type,
+        metavar="REF:BASE",
+        help="Check commits of many refs, each against its own base, in one "
+        "pass (instead of HEAD against --base)",
+    )
     parser.add_argument("--debug", action="store_true", help="Enable debug output")
+    add_arguments(parser)
     args = parser.parse_args()
-
-    commits = get_commit_range(base_ref=args.base, debug=args.debug)
-    failed_commits = []
-
-    for commit in commits:
-        if not has_valid_upstream_status(commit, debug=args.debug):
-            failed_commits.append(commit)
-
-    if failed_commits:
-        print(
-            "\n❌ The following commits are missing or have invalid 'Upstream-Status':\n"
-        )
-        for fc in failed_commits:
-            try:
-                title = (
-                    subprocess.check_output(
-                        ["git", "log", "-n", "1", "--format=%s", fc]
-                    )
-                    .decode()
-                    .strip()
-                )
-            except subprocess.CalledProcessError:
-                title = "(unable to retrieve title)"
-            print(f"  - {fc}: {title}")
-        print("\nExpected format examples:")
-        print("  Upstream-Status: Backport [CB:86758]")
-        print("  Upstream-Status: Inappropriate [Dasharo downstream]")
-        print("  Upstream-Status: Pending")
-        print("  Upstream-Status: Submitted [CB:86758]")
-        sys.exit(1)
-    else:
-        print("✅ All commits contain a valid 'Upstream-Status' tag.")
+    with instrument("check-upstream-status", args) as stats:
+        if args.refs:
+            check_refs(args, stats)
+        else:
+            check_commits(args, stats)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,307 @@
+"""Discovery of the files in directories given to the hooks
+
+Files given explicitly (e.g. by pre-commit) are passed through as they are.
+Directories are walked recursively and only files which aren't ignored by
+.gitignore or --exclude, have one of the hook's extensions, aren't larger
+than --max-size and don't look binary are yielded. Paths are generated
+lazily, so workers start on the first files before the walk finishes.
+"""
+
+import argparse
+import os
+import re
+from typing import Iterator, List, Optional
+
+# Same amount git checks for NUL bytes to tell binary files from text
+BLOCK_SIZE = 8000
+
+MARKDOWN_EXTENSIONS = (".md", ".markdown")
+
+SIZE_SUFFIXES = {"": 1, "K": 1024, "M": 1024**2, "G": 1024**3}
+SIZE = re.compile(r"(\d+)([KMG]?)B?", re.IGNORECASE)
+
+
+def size_type(value) -> int:
+    """argparse type for sizes like 512, 64K or 10M"""
+    match = SIZE.fullmatch(value.strip())
+    if match is None:
+        raise argparse.ArgumentTypeError(f"invalid size: '{value}'")
+    return int(match.group(1)) * SIZE_SUFFIXES[match.group(2).upper()]
+
+
+def add_arguments(parser):
+    parser.add_argument(
+        "--exclude",
+        action="append",
+        default=[],
+        metavar="GLOB",
+        help="Skip files and directories matching GLOB (.gitignore syntax) "
+        "when walking directories",
+    )
+    parser.add_argument(
+        "--max-size",
+        type=size_type,
+        metavar="SIZE",
+        help="Skip files larger than SIZE (e.g. 512K or 10M) found in "
+        "directories (default: no limit)",
+    )
+    parser.add_argument(
+        "--no-gitignore",
+        action="store_true",
+        default=False,
+        help="Don't skip files ignored by .gitignore when walking directories",
+    )
+
+
+def translate(pattern) -> str:
+    """Regular expression of a .gitignore glob, matched against a path
+    relative to the directory of the pattern"""
+    parts = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        at_component_start = i == 0 or pattern[i - 1] == "/"
+        if pattern.startswith("**", i) and at_component_start:
+            if pattern.startswith("**/", i):
+                parts.append("(?:.*/)?")
+                i += 3
+                continue
+            if i + 2 == len(pattern):
+                parts.append(".*")
+                i += 2
+                continue
+        if char == "*":
+            parts.append("[^/]*")
+        elif char == "?":
+            parts.append("[^/]")
+        elif char == "[":
+            end = pattern.find("]", i + 2)
+            if end == -1:
+                parts.append(re.escape(char))
+            else:
+                members = pattern[i + 1 : end].replace("\\", "\\\\")
+                if members.startswith("!"):
+                    members = "^" + members[1:]
+                parts.append(f"[{members}]")
+                i = end
+        elif char == "\\" and i + 1 < len(pattern):
+            i += 1
+            parts.append(re.escape(pattern[i]))
+        else:
+            parts.append(re.escape(char))
+        i += 1
+    return "".join(parts)
+
+
+class Pattern:
+    """Single line of a .gitignore file"""
+
+    def __init__(self, line):
+        self.negate = line.startswith("!")
+        if self.negate:
+            line = line[1:]
+        self.directory_only = line.endswith("/")
+        line = line.rstrip("/")
+        # Patterns without a slash match at any depth, others are anchored to
+        # the directory of the .gitignore file
+        prefix = "" if "/" in line else "(?:.*/)?"
+        self.regex = re.compile(prefix + translate(line.lstrip("/")))
+
+    def matches(self, path, is_directory) -> bool:
+        if self.directory_only and not is_directory:
+            return False
+        return self.regex.fullmatch(path) is not None
+
+
+def parse_patterns(lines) -> List[Pattern]:
+    patterns = []
+    for line in lines:
+        line = line.rstrip("\n")
+        # Trailing spaces are ignored unless escaped
+        if not line.endswith("\\ "):
+            line = line.rstrip(" ")
+        if not line or line.startswith("#"):
+            continue
+        if line.startswith(("\\#", "\\!")):
+            line = line[1:]
+        patterns.append(Pattern(line))
+    return patterns
+
+
+class IgnoreFile:
+    """Patterns of a .gitignore file applying to a directory and below"""
+
+    def __init__(self, prefix, patterns):
+        # Directory of the file relative to the repository root, with
+        # a trailing slash ("" for the root)
+        self.prefix = prefix
+        # The last matching pattern decides
+        self.patterns = list(reversed(patterns))
+
+    @classmethod
+    def read(cls, prefix, path) -> Optional["IgnoreFile"]:
+        try:
+            with open(path, encoding="utf8", errors="ignore") as file:
+                patterns = parse_patterns(file)
+        except OSError:
+            return None
+        return cls(prefix, patterns) if patterns else None
+
+    def ignored(self, path, is_directory) -> Optional[bool]:
+        """Whether path (relative to the repository root) is ignored, None if
+        no pattern matches it"""
+        path = path[len(self.prefix) :]
+        for pattern in self.patterns:
+            if pattern.matches(path, is_directory):
+                return not pattern.negate
+        return None
+
+
+def is_binary(path) -> bool:
+    """Whether the first block of the file contains a NUL byte"""
+    with open(path, "rb") as file:
+        return b"\0" in file.read(BLOCK_SIZE)
+
+
+class Walker:
+    """Filters applied to files found in directories"""
+
+    def __init__(
+        self,
+        extensions=None,
+        excludes=(),
+        max_size=None,
+        gitignore=True,
+        skipped=None,
+    ):
+        self.extensions = None if extensions is None else tuple(extensions)
+        self.excludes = parse_patterns(excludes)
+        self.max_size = max_size
+        self.gitignore = gitignore
+        # Called with the path and the reason of files skipped for their
+        # size or content, e.g. Stats.skip
+        self.skipped = skipped
+
+    def paths(self, paths) -> Iterator[str]:
+        for path in paths:
+            if os.path.isdir(path):
+                prefix, ignore_files = self.__parent_ignore_files(path)
+                yield from self.__walk(path, prefix, "", ignore_files)
+            else:
+                yield path
+
+    def __parent_ignore_files(self, directory):
+        """Path of directory relative to its repository root (with a trailing
+        slash) and the ignore files of its parents, .git/info/exclude included
+
+        Outside of repositories only .gitignore files below directory apply.
+        """
+        if not self.gitignore:
+            return "", []
+        directory = os.path.abspath(directory)
+        parents = []
+        root = directory
+        while not os.path.exists(os.path.join(root, ".git")):
+            parent = os.path.dirname(root)
+            if parent == root:
+                return "", []
+            parents.append(parent)
+            root = parent
+        ignore_files = [
+            IgnoreFile.read("", os.path.join(root, ".git", "info", "exclude"))
+        ]
+        for parent in reversed(parents):
+            prefix = os.path.relpath(parent, root).replace(os.sep, "/") + "/"
+            ignore_files.append(
+                IgnoreFile.read(
+                    "" if prefix == "./" else prefix,
+                    os.path.join(parent, ".gitignore"),
+                )
+            )
+        prefix = os.path.relpath(directory, root).replace(os.sep, "/") + "/"
+        return (
+            "" if prefix == "./" else prefix,
+            [ignore_file for ignore_file in ignore_files if ignore_file is not None],
+        )
+
+    def __walk(self, directory, prefix, relative, ignore_files) -> Iterator[str]:
+        """Files below directory, prefix is its path relative to the
+        repository root and relative its path relative to the walked path"""
+        if self.gitignore:
+            ignore_file = IgnoreFile.read(prefix, os.path.join(directory, ".gitignore"))
+            if ignore_file is not None:
+                ignore_files = ignore_files + [ignore_file]
+        try:
+            with os.scandir(directory) as iterator:
+                entries = sorted(iterator, key=lambda entry: entry.name)
+        except OSError:
+            return
+        for entry in entries:
+            # Symlinks aren't followed, git tracks them as links, and a hook
+            # fixing one would rewrite a file outside of the walked tree
+            try:
+                is_directory = entry.is_dir(follow_symlinks=False)
+                if not is_directory and not entry.is_file(follow_symlinks=False):
+                    continue
+            except OSError:
+                continue
+            if is_directory and entry.name == ".git":
+                continue
+            if any(
+                pattern.matches(relative + entry.name, is_directory)
+                for pattern in self.excludes
+            ):
+                continue
+            if self.__ignored(prefix + entry.name, is_directory, ignore_files):
+                continue
+            path = entry.path if directory != os.curdir else entry.name
+            if is_directory:
+                yield from self.__walk(
+                    path,
+                    prefix + entry.name + "/",
+                    relative + entry.name + "/",
+                    ignore_files,
+                )
+            elif self.__accepted(entry, path):
+                yield path
+
+    @staticmethod
+    def __ignored(path, is_directory, ignore_files) -> bool:
+        # Deeper .gitignore files take precedence
+        for ignore_file in reversed(ignore_files):
+            ignored = ignore_file.ignored(path, is_directory)
+            if ignored is not None:
+                return ignored
+        return False
+
+    def __accepted(self, entry, path) -> bool:
+        if self.extensions is not None and not entry.name.endswith(self.extensions):
+            return False
+        try:
+            if self.max_size is not None and entry.stat().st_size > self.max_size:
+                self.__skip(path, "too large")
+                return False
+            if is_binary(path):
+                self.__skip(path, "binary")
+                return False
+        except OSError:
+            # Reported by the hook, like for files given explicitly
+            return True
+        return True
+
+    def __skip(self, path, reason):
+        if self.skipped is not None:
+            self.skipped(path, reason)
+
+
+def discover(args, extensions=None, stats=None) -> Iterator[str]:
+    """Files of args.files (directories expanded) with the options added by
+    add_arguments"""
+    walker = Walker(
+        extensions,
+        args.exclude,
+        args.max_size,
+        not args.no_gitignore,
+        None if stats is None else stats.skip,
+    )
+    return walker.paths(args.files)
@@ -0,0 +1,52 @@
+"""File helpers shared by the hooks"""
+
+import os
+import shutil
+import tempfile
+
+
+class AtomicWriter:
+    """Write a file through a temporary file renamed over it on commit()
+
+    The temporary file is created next to the target, so the rename is
+    atomic and an interrupted write never leaves a truncated file behind.
+    If commit() isn't called before leaving the context, or an exception is
+    raised, the target is left untouched. Symbolic links are resolved, so
+    their target is replaced and keeps its mode.
+
+        with AtomicWriter("file.md") as writer:
+            writer.file.write(content)
+            writer.commit()
+    """
+
+    def __init__(self, path, mode="w", encoding="utf-8", newline=None):
+        # Symbolic links are written through, like by an in-place write
+        self.path = os.path.realpath(path)
+        self.mode = mode
+        self.encoding = None if "b" in mode else encoding
+        self.newline = None if "b" in mode else newline
+        self.file = None
+        self.committed = False
+
+    def __enter__(self):
+        directory, name = os.path.split(os.path.abspath(self.path))
+        fd, self.temp_path = tempfile.mkstemp(
+            prefix=f".{name}.", suffix=".tmp", dir=directory
+        )
+        self.file = open(fd, self.mode, encoding=self.encoding, newline=self.newline)
+        return self
+
+    def commit(self):
+        self.committed = True
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.file.close()
+        if self.committed and exc_type is None:
+            try:
+                shutil.copymode(self.path, self.temp_path)
+            except OSError:
+                pass
+            os.replace(self.temp_path, self.path)
+        else:
+            os.remove(self.temp_path)
+        return False
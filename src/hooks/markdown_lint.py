@@ -0,0 +1,793 @@
+"""Markdown linter running the most common markdownlint rules in-process
+
+Rules are configured by .markdownlint.yaml (or .json), the same file as the
+one of the Docker based markdownlint-cli hook, rules which aren't implemented
+here are ignored. Files are tokenized line by line in a single pass and each
+rule only sees the kinds of lines it checks. Messages have the format of
+markdownlint-cli and inline <!-- markdownlint-disable --> comments are
+honoured.
+
+Like in markdownlint, MD009 doesn't report trailing spaces in fenced and
+indented code blocks, as some languages need them. test/markdown_lint has a
+fixture for that.
+"""
+
+import argparse
+import functools
+import json
+import os
+import re
+import sys
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from hooks import discovery
+from hooks.fileio import AtomicWriter
+from hooks.parallel import add_jobs_argument, imap_ordered
+from hooks.stats import FileStats, add_arguments, instrument, timed
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+# Searched in this order, like markdownlint-cli does
+CONFIG_FILES = [".markdownlint.json", ".markdownlint.yaml", ".markdownlint.yml"]
+
+# Kinds of lines
+FRONT_MATTER = "front matter"
+BLANK = "blank"
+TEXT = "text"
+ATX = "atx heading"
+SETEXT_TEXT = "setext heading"
+SETEXT_UNDERLINE = "setext underline"
+BREAK = "thematic break"
+LIST_ITEM = "list item"
+TABLE = "table"
+HTML = "html comment"
+FENCE_OPEN = "fence open"
+FENCE_CLOSE = "fence close"
+CODE = "code"
+CODE_KINDS = frozenset({FENCE_OPEN, FENCE_CLOSE, CODE})
+HEADING_KINDS = frozenset({ATX, SETEXT_TEXT})
+# Everything but front matter, which markdownlint doesn't check
+ALL_KINDS = frozenset(
+    {BLANK, TEXT, ATX, SETEXT_TEXT, SETEXT_UNDERLINE, BREAK, LIST_ITEM, TABLE, HTML}
+    | CODE_KINDS
+)
+
+FENCE = re.compile(r"^(\s*)(`{3,}|~{3,})(.*)$")
+ATX_HEADING = re.compile(r"^(\s*)(#{1,6})(?=[ \t]|$)")
+ATX_CLOSING = re.compile(r"[ \t]#+[ \t]*$")
+SETEXT = re.compile(r"^ {0,3}(=+|-+)[ \t]*$")
+THEMATIC_BREAK = re.compile(
+    r"^ {0,3}(?:(?:\*[ \t]*){3,}|(?:-[ \t]*){3,}|(?:_[ \t]*){3,})$"
+)
+LIST_MARKER = re.compile(r"^(\s*)([*+-]|\d{1,9}[.)])([ \t]+|$)")
+INLINE_CONFIG = re.compile(
+    r"<!--\s*markdownlint-(disable-file|enable-file|disable-next-line|"
+    r"disable-line|disable|enable|capture|restore)((?:\s+[^\s>]+)*?)\s*-->"
+)
+
+
+class ConfigError(Exception):
+    """Markdownlint configuration can't be read"""
+
+
+class Token(NamedTuple):
+    number: int
+    text: str
+    kind: str
+    indent: int
+    # Heading level, or nesting of an unordered list item (-1 if it is
+    # ordered or nested in an ordered list)
+    level: int = 0
+    # Heading style or info string of a fence
+    info: str = ""
+    in_list: bool = False
+
+
+class Violation(NamedTuple):
+    line: int
+    # 0 if the rule doesn't report columns
+    column: int
+    rule: "Rule"
+    detail: str = ""
+    context: str = ""
+    # Takes the line (without line ending) and returns the fixed one, or
+    # None if the line should be removed
+    fix: Optional[Callable[[str], Optional[str]]] = None
+
+    def format(self, filename) -> str:
+        """Message in the format of markdownlint-cli"""
+        position = f"{self.line}:{self.column}" if self.column else str(self.line)
+        message = (
+            f"{filename}:{position} {'/'.join(self.rule.names)} "
+            f"{self.rule.description}"
+        )
+        if self.detail:
+            message += f" [{self.detail}]"
+        if self.context:
+            context = self.context
+            if len(context) > 30:
+                context = context[:30] + "..."
+            message += f' [Context: "{context}"]'
+        return message
+
+
+class ListItem(NamedTuple):
+    content_indent: int
+    ordered: bool
+
+
+def __classify(lines):
+    """Token for every line, setext headings aren't recognized here yet"""
+    fence = None
+    in_comment = False
+    front_matter = False
+    lists = []
+    previous_kind = BLANK
+    for number, text in enumerate(lines, 1):
+        stripped = text.strip()
+        indent = len(text[: len(text) - len(text.lstrip())].expandtabs(4))
+        level = 0
+        info = ""
+        if number == 1 and text.rstrip() == "---":
+            kind = FRONT_MATTER
+            front_matter = True
+        elif front_matter:
+            kind = FRONT_MATTER
+            front_matter = text.rstrip() not in ("---", "...")
+        elif fence is not None:
+            match = FENCE.match(text)
+            if (
+                match
+                and match.group(2)[0] == fence[0]
+                and len(match.group(2)) >= fence[1]
+                and not match.group(3).strip()
+            ):
+                kind = FENCE_CLOSE
+                fence = None
+            else:
+                kind = CODE
+        elif in_comment:
+            kind = HTML
+            in_comment = "-->" not in text
+        elif not stripped:
+            kind = BLANK
+        elif indent >= 4 and not lists and previous_kind not in (TEXT, TABLE):
+            # Indented code block
+            kind = CODE
+        else:
+            fence_match = FENCE.match(text)
+            heading_match = ATX_HEADING.match(text)
+            marker_match = LIST_MARKER.match(text)
+            if fence_match and not (
+                fence_match.group(2)[0] == "`" and "`" in fence_match.group(3)
+            ):
+                kind = FENCE_OPEN
+                fence = (fence_match.group(2)[0], len(fence_match.group(2)))
+                info = fence_match.group(3).strip()
+            elif heading_match and (indent <= 3 or lists):
+                kind = ATX
+                level = len(heading_match.group(2))
+                closed = ATX_CLOSING.search(text, heading_match.end())
+                info = "atx_closed" if closed else "atx"
+            elif SETEXT.match(text) and previous_kind == TEXT:
+                kind = SETEXT_UNDERLINE
+                level = 1 if stripped[0] == "=" else 2
+            elif THEMATIC_BREAK.match(text):
+                kind = BREAK
+            elif stripped.startswith("<!--"):
+                kind = HTML
+                in_comment = "-->" not in text[text.index("<!--") + 4 :]
+            elif marker_match:
+                kind = LIST_ITEM
+            elif stripped.startswith("|"):
+                kind = TABLE
+            else:
+                kind = TEXT
+
+            # Only paragraph lines can continue a list item without being
+            # indented enough (lazy continuation)
+            if kind != TEXT or previous_kind == BLANK:
+                while lists and indent < lists[-1].content_indent:
+                    lists.pop()
+            if kind == LIST_ITEM:
+                marker = marker_match.group(2)
+                ordered = marker[0].isdigit()
+                ordered_parent = any(item.ordered for item in lists)
+                level = -1 if ordered or ordered_parent else len(lists)
+                spaces = len(marker_match.group(3).expandtabs(4))
+                if not 1 <= spaces <= 4:
+                    spaces = 1
+                lists.append(ListItem(indent + len(marker) + spaces, ordered))
+        yield Token(number, text, kind, indent, level, info, bool(lists))
+        previous_kind = kind
+
+
+def tokenize(lines):
+    """Yield a Token for every line of lines (strings without line endings)
+
+    This is a single pass with one line of lookahead, which is needed to
+    recognize setext headings. Block structure is approximated: nesting of
+    lists is derived from indentation and blockquotes aren't recognized.
+    """
+    previous = None
+    for token in __classify(lines):
+        if token.kind == SETEXT_UNDERLINE:
+            previous = previous._replace(
+                kind=SETEXT_TEXT, level=token.level, info="setext"
+            )
+        if previous is not None:
+            yield previous
+        previous = token
+    if previous is not None:
+        yield previous
+
+
+class Rule:
+    """Base of rules, instantiated for every linted file
+
+    check() is called for tokens of the kinds listed in kinds and end()
+    after the last one, both yield violations.
+    """
+
+    # Code first, then aliases
+    names = ()
+    description = ""
+    defaults = {}
+    kinds = frozenset()
+
+    def __init__(self, params):
+        self.params = params
+
+    @property
+    def code(self) -> str:
+        return self.names[0]
+
+    def violation(self, token, column=0, detail="", context="", fix=None):
+        return Violation(token.number, column, self, detail, context, fix)
+
+    def check(self, token):
+        return ()
+
+    def end(self, last, final_newline):
+        return ()
+
+
+class HeadingStyle(Rule):
+    names = ("MD003", "heading-style", "header-style")
+    description = "Heading style"
+    defaults = {"style": "consistent"}
+    kinds = HEADING_KINDS
+
+    def __init__(self, params):
+        super().__init__(params)
+        self.style = params["style"]
+
+    def check(self, token):
+        actual = token.info
+        if self.style == "consistent":
+            self.style = actual
+        if actual == self.style:
+            return
+        top_level = token.level <= 2
+        expected = self.style
+        if expected in ("setext_with_atx", "setext_with_atx_closed"):
+            expected = "setext" if top_level else expected[len("setext_with_") :]
+        if actual != expected:
+            yield self.violation(
+                token, detail=f"Expected: {expected}; Actual: {actual}"
+            )
+
+
+class ListIndent(Rule):
+    names = ("MD007", "ul-indent")
+    description = "Unordered list indentation"
+    defaults = {"indent": 2, "start_indented": False, "start_indent": 2}
+    kinds = frozenset({LIST_ITEM})
+
+    def __init__(self, params):
+        super().__init__(params)
+        self.indent = params["indent"]
+        self.start = 0
+        if params["start_indented"]:
+            self.start = params["start_indent"]
+
+    def check(self, token):
+        if token.level < 0:
+            return
+        expected = self.start + token.level * self.indent
+        if token.indent != expected:
+            yield self.violation(
+                token,
+                1,
+                f"Expected: {expected}; Actual: {token.indent}",
+                fix=lambda text: " " * expected + text.lstrip(),
+            )
+
+
+class NoTrailingSpaces(Rule):
+    names = ("MD009", "no-trailing-spaces")
+    description = "Trailing spaces"
+    defaults = {"br_spaces": 2, "list_item_empty_lines": False, "strict": False}
+    # Trailing spaces in code are allowed, see the module docstring
+    kinds = ALL_KINDS - CODE_KINDS
+
+    def __init__(self, params):
+        super().__init__(params)
+        self.expected = params["br_spaces"] if params["br_spaces"] >= 2 else 0
+        # In strict mode a line break is allowed only if the paragraph
+        # continues on the next line
+        self.pending = None
+
+    def check(self, token):
+        if self.pending is not None and token.kind != TEXT:
+            yield self.pending
+        self.pending = None
+        text = token.text
+        trailing = len(text) - len(text.rstrip())
+        if not trailing:
+            return
+        if token.kind == BLANK and token.in_list:
+            if self.params["list_item_empty_lines"]:
+                return
+        violation = self.violation(
+            token,
+            len(text) - trailing + 1,
+            f"Expected: {'0 or ' if self.expected else ''}{self.expected}; "
+            f"Actual: {trailing}",
+            fix=str.rstrip,
+        )
+        if trailing != self.expected:
+            yield violation
+        elif self.params["strict"]:
+            if token.kind in (TEXT, LIST_ITEM):
+                self.pending = violation
+            else:
+                yield violation
+
+    def end(self, last, final_newline):
+        if self.pending is not None:
+            yield self.pending
+
+
+class NoHardTabs(Rule):
+    names = ("MD010", "no-hard-tabs")
+    description = "Hard tabs"
+    defaults = {"code_blocks": True, "spaces_per_tab": 1}
+    kinds = ALL_KINDS - {BLANK}
+
+    def __init__(self, params):
+        super().__init__(params)
+        self.spaces = " " * params["spaces_per_tab"]
+
+    def check(self, token):
+        if token.kind in CODE_KINDS and not self.params["code_blocks"]:
+            return
+        text = token.text
+        column = text.find("\t")
+        while column != -1:
+            yield self.violation(
+                token,
+                column + 1,
+                f"Column: {column + 1}",
+                fix=lambda text: text.replace("\t", self.spaces),
+            )
+            column = text.find("\t", len(text) - len(text[column:].lstrip("\t")))
+
+
+class NoMultipleBlanks(Rule):
+    names = ("MD012", "no-multiple-blanks")
+    description = "Multiple consecutive blank lines"
+    defaults = {"maximum": 1}
+    kinds = ALL_KINDS
+
+    def __init__(self, params):
+        super().__init__(params)
+        self.blanks = 0
+
+    def check(self, token):
+        if token.kind != BLANK:
+            self.blanks = 0
+            return
+        self.blanks += 1
+        if self.blanks > self.params["maximum"]:
+            yield self.violation(
+                token,
+                detail=f"Expected: {self.params['maximum']}; Actual: {self.blanks}",
+                fix=lambda text: None,
+            )
+
+
+class LineLength(Rule):
+    names = ("MD013", "line-length")
+    description = "Line length"
+    defaults = {
+        "line_length": 80,
+        "heading_line_length": 80,
+        "code_block_line_length": 80,
+        "code_blocks": True,
+        "tables": True,
+        "headings": True,
+        "strict": False,
+        "stern": False,
+    }
+    kinds = ALL_KINDS - {BLANK}
+    LINK_DEFINITION = re.compile(r"^\s*\[[^\]]+\]:\s*\S")
+    # Lines which are just one long word (e.g. an URL), checked in stern mode
+    SINGLE_WORD = re.compile(r"^(?:[#>\s]*\s)?\S*$")
+
+    def check(self, token):
+        params = self.params
+        if token.kind in HEADING_KINDS:
+            if not params["headings"]:
+                return
+            limit = params["heading_line_length"]
+        elif token.kind in CODE_KINDS:
+            if not params["code_blocks"]:
+                return
+            limit = params["code_block_line_length"]
+        elif token.kind == TABLE and not params["tables"]:
+            return
+        else:
+            limit = params["line_length"]
+        text = token.text
+        if len(text) <= limit or self.LINK_DEFINITION.match(text):
+            return
+        strict = params["strict"] or (params["stern"] and self.SINGLE_WORD.match(text))
+        # Long lines without whitespace beyond the limit can't be wrapped
+        if strict or any(char.isspace() for char in text[limit:]):
+            yield self.violation(
+                token, limit + 1, f"Expected: {limit}; Actual: {len(text)}"
+            )
+
+
+class NoMissingSpaceAtx(Rule):
+    names = ("MD018", "no-missing-space-atx")
+    description = "No space after hash on atx style heading"
+    kinds = frozenset({TEXT})
+    MISSING_SPACE = re.compile(r"^#+[^#\s]")
+    CLOSING_HASH = re.compile(r"#\s*$")
+
+    def check(self, token):
+        text = token.text
+        if self.MISSING_SPACE.match(text) and not self.CLOSING_HASH.search(text):
+            yield self.violation(
+                token,
+                1,
+                context=text.strip(),
+                fix=lambda text: re.sub(r"^(#+)", r"\1 ", text, count=1),
+            )
+
+
+class NoMultipleSpaceAtx(Rule):
+    names = ("MD019", "no-multiple-space-atx")
+    description = "Multiple spaces after hash on atx style heading"
+    kinds = frozenset({ATX})
+    MULTIPLE_SPACES = re.compile(r"^(\s*#+)[ \t]{2,}(?=\S)")
+
+    def check(self, token):
+        if token.info == "atx" and self.MULTIPLE_SPACES.match(token.text):
+            yield self.violation(
+                token,
+                1,
+                context=token.text.strip(),
+                fix=lambda text: self.MULTIPLE_SPACES.sub(r"\1 ", text, count=1),
+            )
+
+
+class HeadingStartLeft(Rule):
+    names = ("MD023", "heading-start-left", "header-start-left")
+    description = "Headings must start at the beginning of the line"
+    kinds = HEADING_KINDS
+
+    def check(self, token):
+        if token.indent:
+            yield self.violation(
+                token, 1, context=token.text, fix=lambda text: text.lstrip()
+            )
+
+
+class FencedCodeLanguage(Rule):
+    names = ("MD040", "fenced-code-language")
+    description = "Fenced code blocks should have a language specified"
+    defaults = {"allowed_languages": [], "language_only": False}
+    kinds = frozenset({FENCE_OPEN})
+
+    def check(self, token):
+        if not token.info:
+            yield self.violation(token, context=token.text.strip())
+            return
+        language = token.info.split()[0]
+        allowed = self.params["allowed_languages"]
+        if allowed and language not in allowed:
+            yield self.violation(
+                token, detail=f'"{language}" is not allowed', context=token.info
+            )
+        elif self.params["language_only"] and token.info != language:
+            yield self.violation(
+                token, detail=f'Info string contains more than language: "{language}"'
+            )
+
+
+class SingleTrailingNewline(Rule):
+    names = ("MD047", "single-trailing-newline")
+    description = "Files should end with a single newline character"
+
+    def end(self, last, final_newline):
+        if last is not None and not final_newline and last.text:
+            yield self.violation(last, len(last.text), fix=lambda text: text + "\n")
+
+
+RULES = [
+    HeadingStyle,
+    ListIndent,
+    NoTrailingSpaces,
+    NoHardTabs,
+    NoMultipleBlanks,
+    LineLength,
+    NoMissingSpaceAtx,
+    NoMultipleSpaceAtx,
+    HeadingStartLeft,
+    FencedCodeLanguage,
+    SingleTrailingNewline,
+]
+RULE_CODES = {rule.names[0]: rule for rule in RULES}
+# Codes by lowercase codes and aliases
+RULE_NAMES = {name.lower(): rule.names[0] for rule in RULES for name in rule.names}
+
+
+def find_config_file() -> Optional[str]:
+    for path in CONFIG_FILES:
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def __read_config(path) -> dict:
+    if not path.endswith(".json") and yaml is None:
+        raise ConfigError(
+            f"{path}: reading YAML configuration requires PyYAML "
+            "(pip install pyyaml), or use .markdownlint.json"
+        )
+    errors = (OSError, ValueError) + ((yaml.YAMLError,) if yaml else ())
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            if path.endswith(".json"):
+                config = json.load(file)
+            else:
+                config = yaml.safe_load(file)
+    except errors as e:
+        raise ConfigError(f"{path}: {e}")
+    if config is None:
+        return {}
+    if not isinstance(config, dict):
+        raise ConfigError(f"{path}: configuration has to be a mapping")
+    extends = config.pop("extends", None)
+    if extends:
+        base = __read_config(os.path.join(os.path.dirname(path), extends))
+        base.update(config)
+        config = base
+    return config
+
+
+def load_config(path=None) -> Dict[str, dict]:
+    """Parameters of the enabled rules by rule code
+
+    Without a configuration file all rules are enabled with their default
+    parameters, like in markdownlint. Unknown parameters are ignored.
+    """
+    config = {} if path is None else __read_config(path)
+    settings = {}
+    for key, value in config.items():
+        code = RULE_NAMES.get(str(key).lower())
+        if code is not None:
+            settings[code] = value
+    default = config.get("default", True)
+    rules = {}
+    for code, rule in RULE_CODES.items():
+        value = settings.get(code, default)
+        if isinstance(value, dict):
+            rules[code] = {**rule.defaults, **value}
+        elif value:
+            rules[code] = dict(rule.defaults)
+    return rules
+
+
+def __rule_codes(names, config):
+    if not names:
+        return set(config)
+    return {RULE_NAMES[name.lower()] for name in names if name.lower() in RULE_NAMES}
+
+
+def lint(lines, config, stats=None) -> List[Violation]:
+    """Violations in lines (with line endings) sorted by position
+
+    config are the rule parameters from load_config(). lines may be a lazy
+    iterable, e.g. an open file, only the current line is kept.
+    """
+    rules = [RULE_CODES[code](params) for code, params in config.items()]
+    checks = {}
+    for rule in rules:
+        for kind in rule.kinds:
+            checks.setdefault(kind, []).append(rule.check)
+
+    last_line = None
+
+    def texts():
+        nonlocal last_line
+        for line in lines:
+            last_line = line
+            yield line.rstrip("\r\n")
+
+    violations = []
+    disabled = frozenset()
+    disabled_next_line = frozenset()
+    disabled_file = set()
+    captured = []
+    token = None
+    for token in tokenize(texts()):
+        disabled_line = disabled | disabled_next_line
+        disabled_next_line = frozenset()
+        if (
+            token.kind != FRONT_MATTER
+            and token.kind not in CODE_KINDS
+            and "markdownlint-" in token.text
+        ):
+            for match in INLINE_CONFIG.finditer(token.text):
+                action = match.group(1)
+                codes = __rule_codes(match.group(2).split(), config)
+                if action == "disable":
+                    disabled = disabled | codes
+                    disabled_line = disabled_line | codes
+                elif action == "enable":
+                    disabled = disabled - codes
+                    disabled_line = disabled_line - codes
+                elif action == "disable-line":
+                    disabled_line = disabled_line | codes
+                elif action == "disable-next-line":
+                    disabled_next_line = disabled_next_line | codes
+                elif action == "disable-file":
+                    disabled_file |= codes
+                elif action == "enable-file":
+                    disabled_file -= codes
+                elif action == "capture":
+                    captured.append(disabled)
+                elif action == "restore":
+                    disabled = captured.pop() if captured else frozenset()
+        for check in checks.get(token.kind, ()):
+            for violation in check(token):
+                if violation.rule.code not in disabled_line:
+                    violations.append(violation)
+
+    if stats is not None and token is not None:
+        stats.lines = token.number
+    final_newline = last_line is None or last_line.endswith(("\n", "\r"))
+    for rule in rules:
+        for violation in rule.end(token, final_newline):
+            if violation.rule.code not in disabled:
+                violations.append(violation)
+    if disabled_file:
+        violations = [v for v in violations if v.rule.code not in disabled_file]
+    violations.sort(key=lambda violation: (violation.line, violation.rule.code))
+    return violations
+
+
+def apply_fixes(lines, violations) -> List[str]:
+    """lines (with line endings) with fixes of violations applied"""
+    fixes = {}
+    for violation in violations:
+        if violation.fix is not None:
+            fixes.setdefault(violation.line, []).append(violation.fix)
+    fixed = []
+    for number, line in enumerate(lines, 1):
+        if number not in fixes:
+            fixed.append(line)
+            continue
+        text = line.rstrip("\r\n")
+        ending = line[len(text) :]
+        for fix in fixes[number]:
+            text = fix(text)
+            if text is None:
+                break
+        if text is not None:
+            fixed.append(text + ending)
+    return fixed
+
+
+def lint_file(filename, config, fix=False, stats=None) -> List[Violation]:
+    """Lint a file, returns violations which remain after fixing it
+
+    With fix set fixable violations are fixed and the file is atomically
+    replaced, its line endings are preserved.
+    """
+    with open(filename, "r", encoding="utf-8", newline="") as file:
+        if stats is not None:
+            stats.bytes = os.fstat(file.fileno()).st_size
+        if not fix:
+            lines = None
+            violations = lint(file, config, stats)
+        else:
+            lines = file.readlines()
+            violations = lint(lines, config, stats)
+    if stats is not None:
+        for violation in violations:
+            stats.matches[violation.rule.code] += 1
+    if lines is None or not any(violation.fix for violation in violations):
+        return violations
+    fixed = apply_fixes(lines, violations)
+    if fixed == lines:
+        return violations
+    with AtomicWriter(filename, "w", newline="") as writer:
+        writer.file.writelines(fixed)
+        writer.commit()
+    return lint(fixed, config)
+
+
+# Worker entry point, returns (messages, error or None, statistics)
+def __lint_collect(filename, config=None, fix=False, collect_stats=False):
+    file_stats = FileStats(filename) if collect_stats else None
+    with timed(file_stats):
+        try:
+            violations = lint_file(filename, config, fix, file_stats)
+        except (OSError, UnicodeDecodeError) as e:
+            return [], f"{filename}: {e}", file_stats
+    return [violation.format(filename) for violation in violations], None, file_stats
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Lint Markdown files with markdownlint rules, in-process",
+        epilog=f"Implemented rules: {', '.join(RULE_CODES)}",
+    )
+    parser.add_argument("files", nargs="*", help="Files or directories to lint")
+    parser.add_argument(
+        "-c",
+        "--config",
+        metavar="FILE",
+        help=f"Configuration file (default: the first of {', '.join(CONFIG_FILES)})",
+    )
+    parser.add_argument(
+        "-f",
+        "--fix",
+        action="store_true",
+        default=False,
+        help="Fix violations where the rule allows it",
+    )
+    add_jobs_argument(parser)
+    discovery.add_arguments(parser)
+    add_arguments(parser)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    with instrument("markdown-lint", args) as stats:
+        try:
+            config = load_config(args.config or find_config_file())
+        except ConfigError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+        process = functools.partial(
+            __lint_collect,
+            config=config,
+            fix=args.fix,
+            collect_stats=stats is not None,
+        )
+        failed = False
+        files = discovery.discover(args, discovery.MARKDOWN_EXTENSIONS, stats)
+        for messages, error, file_stats in imap_ordered(process, files, args.jobs):
+            if file_stats is not None:
+                stats.add(file_stats)
+            for message in messages:
+                print(message)
+            if error is not None:
+                print(f"Error: {error}", file=sys.stderr)
+            if messages or error is not None:
+                failed = True
+        sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
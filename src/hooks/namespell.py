@@ -1,11 +1,38 @@
 import argparse
+import functools
+import io
+import itertools
+import marshal
 import os
 import re
+import subprocess
 import sys
 import time
+from array import array
 from collections import deque
-from importlib import metadata
-from typing import List, NamedTuple
+from typing import Dict, List, NamedTuple, Set, Tuple
+
+from hooks import discovery
+from hooks.cache import ResultCache, config_fingerprint, init_cache_dir, package_version
+from hooks.fileio import AtomicWriter
+from hooks.parallel import add_jobs_argument, imap_ordered
+from hooks.patch import UnifiedDiff, apply_edits
+from hooks.stats import FileStats, add_arguments, instrument, measure, timed
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+try:
+    from re import _compiler as sre_compile
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_compile
+    import sre_parse
 
 NAME_RULES = {
     "Zarhus": "Zarhus",
@@ -27,9 +54,35 @@ COMMENT_STRINGS = {
     ".yml": "#",
     "default": "#",
 }
+# Files checked in directories given on the command line
+EXTENSIONS = tuple(extension for extension in COMMENT_STRINGS if extension != "default")
 
 IGNORE_STRING = "namespell:disable"
 
+DEFAULT_CACHE_DIR = os.path.join(".cache", "namespell")
+# Socket of "namespell serve" in the cache directory
+SERVER_SOCKET = "server.sock"
+
+# Repository rule dictionary, [tool.namespell] in pyproject.toml is used if
+# it doesn't exist
+CONFIG_FILE = ".namespell.toml"
+
+# Table headers and keys of pyproject.toml lines
+TOML_TABLE = re.compile(r"^\s*\[\[?([^\]]+)\]")
+TOML_KEY = re.compile(r"^\s*([\w.\- ]+?)\s*=")
+TOML_DOTS = re.compile(r"\s*\.\s*")
+
+# Unified diff hunk header, only the new file range is of interest
+HUNK_HEADER = re.compile(r"^@@ -\S+ \+(\d+)(?:,(\d+))? @@")
+
+# Shared by all lines without ignore statements
+NO_RULES = frozenset()
+
+# Characters which, when directly adjacent to a name, make it part of another
+# token (path, URL, identifier, option, etc.) rather than a standalone word
+NAME_BOUNDARY_BEFORE = r"(?<![-_\./=\"#])"
+NAME_BOUNDARY_AFTER = r"(?![-_\./=\"#])"
+
 
 class IgnoreBlock(NamedTuple):
     start: str
@@ -51,11 +104,358 @@ IGNORE_INLINE = {
     "default": [],
 }
 
-# Stack that keeps track of "active" blocks to be ignored by storing their
-# start strings. This is necessary for nested blocks (e.g code block inside
-# comment)
-blocks = deque()
-current_start_token = ""
+
+class NameMatcher:
+    """Single precompiled pattern matching all names from a rule dict
+
+    The whole line is scanned once regardless of the number of rules, matches
+    are mapped back to the rule they belong to with a case-insensitive lookup.
+    """
+
+    def __init__(self, rules, names=None, pattern=None, fingerprint=None):
+        self.rules = rules
+        self.all_rules = frozenset(rules)
+        self.names = names or {name.lower(): name for name in rules}
+        if pattern is None:
+            names_pattern = self.trie_pattern(rules)
+            pattern = re.compile(
+                rf"{NAME_BOUNDARY_BEFORE}(?:{names_pattern}){NAME_BOUNDARY_AFTER}",
+                re.IGNORECASE,
+            )
+        self.pattern = pattern
+        self.fingerprint = fingerprint or config_fingerprint(sorted(rules.items()))
+
+    def finditer(self, line, pos=0, endpos=sys.maxsize):
+        """Yield (match, rule name) pairs for all names found in line"""
+        for match in self.pattern.finditer(line, pos, endpos):
+            yield match, self.names[match.group().lower()]
+
+    def save(self, path):
+        """Serialize the matcher, including the compiled regex program"""
+        program = None
+        try:
+            program = _sre_program(self.pattern.pattern, self.pattern.flags)
+        except Exception:
+            # Internals of the re module changed, loading has to recompile
+            pass
+        data = {
+            "python": sys.hexversion,
+            "sre": sre_compile.MAGIC,
+            "rules": self.rules,
+            "names": self.names,
+            "fingerprint": self.fingerprint,
+            "source": self.pattern.pattern,
+            "flags": int(self.pattern.flags),
+            "program": program,
+        }
+        with AtomicWriter(path, "wb") as writer:
+            writer.file.write(marshal.dumps(data))
+            writer.commit()
+
+    @classmethod
+    def load(cls, path):
+        """Load a matcher saved by save(), without recompiling the regex if the
+        program was saved by the same Python version"""
+        with open(path, "rb") as file:
+            data = marshal.loads(file.read())
+        pattern = None
+        program = data["program"]
+        if (
+            program is not None
+            and data["python"] == sys.hexversion
+            and data["sre"] == sre_compile.MAGIC
+        ):
+            flags, code, groups, groupindex, indexgroup = program
+            try:
+                code = array("I", code).tolist()
+                pattern = sre_compile._sre.compile(
+                    data["source"], flags, code, groups, groupindex, indexgroup
+                )
+            except (RuntimeError, TypeError, ValueError):
+                pattern = None
+        if pattern is None:
+            pattern = re.compile(data["source"], data["flags"])
+        return cls(data["rules"], data["names"], pattern, data["fingerprint"])
+
+    @staticmethod
+    def trie_pattern(names) -> str:
+        """Build a regex alternation of names factored by their common prefixes
+
+        Unlike a flat "name1|name2|..." alternation, the regex engine only
+        follows branches matching the text seen so far, so the cost of a scan
+        barely depends on the number of names.
+        """
+        trie = {}
+        for name in names:
+            node = trie
+            for char in name.lower():
+                node = node.setdefault(char, {})
+            # Empty key marks the end of a name
+            node[""] = {}
+
+        def build(node):
+            branches = [
+                re.escape(char) + build(child)
+                for char, child in sorted(node.items())
+                if char
+            ]
+            if not branches:
+                return ""
+            if len(branches) == 1 and "" not in node:
+                return branches[0]
+            group = f"(?:{'|'.join(branches)})"
+            # Optional group is greedy, so longer names are preferred
+            return group + "?" if "" in node else group
+
+        return build(trie) if trie else "(?!)"
+
+
+def _sre_program(source, flags):
+    """Arguments of _sre.compile() for a pattern, mirrors re.compile()
+
+    Compiling a regex with thousands of alternatives takes most of the start
+    up time and the re module can't serialize compiled patterns, so the
+    program is stored together with the rules and passed to _sre directly.
+    It's only valid for the same Python version (and _sre MAGIC).
+    """
+    parsed = sre_parse.parse(source, flags)
+    code = sre_compile._code(parsed, flags)
+    groupindex = parsed.state.groupdict
+    indexgroup = [None] * parsed.state.groups
+    for name, index in groupindex.items():
+        indexgroup[index] = name
+    return (
+        int(flags | parsed.state.flags),
+        # Stored as raw bytes, unmarshaling a list of ints object by object
+        # would cost as much as compiling the pattern
+        array("I", code).tobytes(),
+        parsed.state.groups - 1,
+        dict(groupindex),
+        tuple(indexgroup),
+    )
+
+
+NAME_MATCHER = NameMatcher(NAME_RULES)
+
+
+def __user_config_path() -> str:
+    config_home = os.environ.get("XDG_CONFIG_HOME") or os.path.join(
+        os.path.expanduser("~"), ".config"
+    )
+    return os.path.join(config_home, "3mdeb-hooks", "namespell.toml")
+
+
+def __has_namespell_section(path) -> bool:
+    """Whether pyproject.toml has rules, checked without parsing it"""
+    table = ""
+    try:
+        with open(path, encoding="utf8", errors="ignore") as file:
+            for line in file:
+                header = TOML_TABLE.match(line)
+                if header is not None:
+                    table = TOML_DOTS.sub(".", header.group(1).strip())
+                    key = table
+                else:
+                    key = TOML_KEY.match(line)
+                    if key is None:
+                        continue
+                    key = TOML_DOTS.sub(".", f"{table}.{key.group(1)}".lstrip("."))
+                if key == "tool.namespell" or key.startswith("tool.namespell."):
+                    return True
+    except OSError:
+        pass
+    return False
+
+
+def find_config_files(extra=()) -> List[str]:
+    """Rule dictionaries to load, from the most general to the most specific
+
+    These are the org-wide dictionary from the user config directory, the
+    repository one (.namespell.toml or the [tool.namespell] section of
+    pyproject.toml, which is skipped if it has none) and the ones passed
+    explicitly.
+    """
+    files = []
+    user_config = __user_config_path()
+    if os.path.isfile(user_config):
+        files.append(user_config)
+    if os.path.isfile(CONFIG_FILE):
+        files.append(CONFIG_FILE)
+    elif os.path.isfile("pyproject.toml") and __has_namespell_section("pyproject.toml"):
+        files.append("pyproject.toml")
+    files.extend(extra)
+    return files
+
+
+def __read_rules_layer(path) -> dict:
+    if tomllib is None:
+        raise ConfigError(
+            f"{path}: reading rule dictionaries requires Python 3.11+ or tomli"
+        )
+    try:
+        with open(path, "rb") as file:
+            layer = tomllib.load(file)
+    except (OSError, tomllib.TOMLDecodeError) as e:
+        raise ConfigError(f"{path}: {e}")
+    if os.path.basename(path) == "pyproject.toml":
+        layer = layer.get("tool", {}).get("namespell", {})
+    for key in ("names", "disable"):
+        if not isinstance(layer.get(key, []), list):
+            raise ConfigError(f"{path}: '{key}' has to be a list of names")
+    return layer
+
+
+def load_rules(paths) -> dict:
+    """Merge NAME_RULES with the rule dictionaries from paths
+
+    Each dictionary is a TOML file which may contain:
+
+        inherit = false          # drop rules defined so far (default: true)
+        disable = ["UEFI"]       # drop selected rules defined so far
+        names = ["Zarhus"]       # add rules, spelled the correct way
+    """
+    rules = dict(NAME_RULES)
+    for path in paths:
+        layer = __read_rules_layer(path)
+        if not layer.get("inherit", True):
+            rules = {}
+        for name in layer.get("disable", []):
+            rules.pop(name, None)
+        for name in layer.get("names", []):
+            rules[name] = name
+    return rules
+
+
+def load_matcher(paths, cache_dir=None) -> NameMatcher:
+    """Matcher for the rule dictionaries from paths
+
+    The compiled matcher is stored in cache_dir, keyed by the state of the
+    dictionary files, so subsequent runs load it without parsing the
+    dictionaries or compiling the regex.
+    """
+    if not paths:
+        return NAME_MATCHER
+    artifact = None
+    if cache_dir is not None:
+        try:
+            state = [
+                (path, os.stat(path).st_mtime_ns, os.stat(path).st_size)
+                for path in paths
+            ]
+        except OSError as e:
+            raise ConfigError(str(e))
+        key = config_fingerprint(state, package_version(), sys.hexversion)
+        artifact = os.path.join(cache_dir, "matchers", key)
+        try:
+            return NameMatcher.load(artifact)
+        except (OSError, EOFError, ValueError, TypeError, KeyError):
+            pass
+    matcher = NameMatcher(load_rules(paths))
+    if artifact is not None:
+        try:
+            init_cache_dir(os.path.dirname(artifact))
+            # Only the matcher for the current dictionaries is kept
+            for entry in os.scandir(os.path.dirname(artifact)):
+                if entry.is_file() and not entry.name.startswith("."):
+                    os.remove(entry.path)
+            matcher.save(artifact)
+        except (OSError, ValueError):
+            pass
+    return matcher
+
+
+@functools.lru_cache(maxsize=None)
+def __worker_matcher(paths, cache_dir):
+    return load_matcher(paths, cache_dir)
+
+
+class Segmenter:
+    """Single pass state machine splitting lines into checkable spans
+
+    Walks each line once, skipping ignore blocks (which may span multiple
+    lines, e.g. fenced code or HTML comments) and inline ignores (e.g. code
+    spans). Inside an ignored block or span only its end token is looked for,
+    so other tokens nested in it (e.g. a code fence in a comment) are ignored
+    with it. The state is kept in the instance, use one per file.
+    """
+
+    def __init__(self, ignore_blocks, ignore_inline):
+        # Start token -> (end token, whether it may span multiple lines)
+        self.tokens = {}
+        for block in ignore_blocks:
+            self.tokens[block.start] = (block.end, True)
+        for inline in ignore_inline:
+            self.tokens.setdefault(inline.start, (inline.end, False))
+        self.start_pattern = None
+        if self.tokens:
+            # Longest tokens first, so "```" isn't taken for "`"
+            self.start_pattern = re.compile(
+                "|".join(
+                    re.escape(token)
+                    for token in sorted(self.tokens, key=len, reverse=True)
+                )
+            )
+        # End token of the currently open block
+        self.block_end = None
+
+    def spans(self, line):
+        """Yield (start, end) indices of parts of line which should be checked"""
+        position = 0
+        length = len(line)
+        while position < length:
+            if self.block_end is not None:
+                end = line.find(self.block_end, position)
+                if end == -1:
+                    return
+                position = end + len(self.block_end)
+                self.block_end = None
+                continue
+            if self.start_pattern is None:
+                yield position, length
+                return
+            match = self.start_pattern.search(line, position)
+            if match is None:
+                yield position, length
+                return
+            if match.start() > position:
+                yield position, match.start()
+            end_token, multiline = self.tokens[match.group()]
+            end = line.find(end_token, match.end())
+            if end != -1:
+                position = end + len(end_token)
+            elif multiline:
+                self.block_end = end_token
+                return
+            else:
+                # Unterminated inline span, the start token is just a character
+                yield match.start(), match.end()
+                position = match.end()
+
+
+class Diagnostic(NamedTuple):
+    filename: str
+    line: int
+    column: int
+    found: str
+    expected: str
+
+    def __str__(self):
+        return (
+            f"{self.filename}:{self.line}: '{self.found}' should be '{self.expected}'"
+        )
+
+
+class RuleWarning(NamedTuple):
+    filename: str
+    line: int
+    rule: str
+    available: Tuple[str, ...]
+
+    def __str__(self):
+        available = list(self.available[:10])
+        if len(self.available) > 10:
+            available.append(f"... ({len(self.available) - 10} more)")
+        return f"Warning: {self.filename}:{self.line}: {self.rule} rule does not exist. Available rules: {available}"
 
 
 def __get_comment_string(extension) -> str:
@@ -87,75 +487,15 @@ def __log_verbose(message, verbose):
         print(message)
 
 
-# Check if the line starts/ends a block to be ignored and modify the blocks
-# stack accordingly
-def __check_block(ignore_blocks, line, verbose=False):
-    global current_start_token
-    for ignore_block in ignore_blocks:
-        start_index = line.find(ignore_block.start)
-        end_index = line.find(ignore_block.end)
-        if start_index != -1:
-            # For identical start and end tokens: If the last start token was
-            # the same as this one, then this one is an end token
-            if (
-                ignore_block.start == ignore_block.end
-                and current_start_token == ignore_block.start
-            ):
-                start_index = -1
-            else:
-                __log_verbose(
-                    f"BLOCK START: {ignore_block.start}, INDEX: {start_index}", verbose
-                )
-                blocks.append(ignore_block.start)
-                current_start_token = ignore_block.start
-        # Check if block end matches the latest block start token
-        # If true, remove it from the stack
-        if end_index != -1 and end_index != start_index:
-            __log_verbose(f"BLOCK END: {ignore_block.end}, INDEX: {end_index}", verbose)
-            if current_start_token == ignore_block.start:
-                current_start_token = ""
-                try:
-                    blocks.pop()
-                    if blocks:
-                        # Get element from the top without popping it
-                        current_start_token = blocks[-1]
-                except IndexError:
-                    return
-
-
-# return list of indices of words to be ignored
-def __check_inline_ignore(ignore_inline, line, verbose=False):
-    indices = []
-    for element in ignore_inline:
-        start_index = line.find(element.start)
-        if start_index == -1:
-            continue
-        position = 0
-        line_to_process = line
-        while start_index != -1:
-            __log_verbose(f"INLINE BLOCK START: {position + start_index}", verbose)
-            position += start_index
-            line_to_process = line_to_process[start_index + 1 :]
-            end_index = line_to_process.find(element.end) + 1
-            if end_index == -1:
-                print("Error: No matching inline comment/code ending tag")
-            __log_verbose(f"INLINE BLOCK END: {position + end_index}", verbose)
-            line_slice = line_to_process[: end_index - 1]
-            for name in NAME_RULES.keys():
-                pattern = re.compile(
-                    rf"(?<![-_\./=\"#]){re.escape(name)}(?![-_\./=\"#])", re.IGNORECASE
-                )
-                for m in re.finditer(pattern, line_slice):
-                    i = position + m.start() + 1
-                    indices.append(i)
-            position += end_index + 1
-            line_to_process = line_to_process[end_index:]
-            start_index = line_to_process.find(element.start)
-    return indices
-
-
-def __get_active_rules(
-    filename, line, line_number, line_ignore_pattern, file_ignore_pattern
+# Return ids of rules disabled by an ignore statement in the line
+def __get_disabled_rules(
+    filename,
+    line,
+    line_number,
+    line_ignore_pattern,
+    file_ignore_pattern,
+    matcher,
+    report,
 ):
     are_file_rules = False
     # If the first line contains ignore statement ONLY, it applies to the whole
@@ -165,7 +505,7 @@ def __get_active_rules(
         are_file_rules = True
     else:
         matched = re.match(line_ignore_pattern, line) is not None
-    active_rules = NAME_RULES.copy()
+    disabled_rules = NO_RULES
     if matched:
         pattern = re.compile(r"namespell:disable\s*(.*)")
         match = pattern.search(line)
@@ -175,96 +515,237 @@ def __get_active_rules(
         rules_to_disable = match.group(1)
         # Disable all rules in this line
         if re.match(r"namespell:disable\s*$", match.group(0).replace("-->", "")):
-            active_rules = {}
+            disabled_rules = matcher.all_rules
         else:
             # Get rid of whitespaces and comment closing (markdown)
             to_disable_list = rules_to_disable.replace(" ", "").replace("-->", "")
             to_disable_list = to_disable_list.split(",")
+            disabled_rules = set()
             for rule in to_disable_list:
-                removed = active_rules.pop(rule, None)
-                if removed is None:
-                    print(
-                        f"Warning: {filename}:{line_number}: {rule} rule does not exist. Available rules: {list(NAME_RULES.keys())}"
+                if rule in matcher.rules:
+                    disabled_rules.add(rule)
+                else:
+                    report(
+                        RuleWarning(filename, line_number, rule, tuple(matcher.rules))
                     )
+            disabled_rules = frozenset(disabled_rules)
 
-    return active_rules, are_file_rules
+    return disabled_rules, are_file_rules
 
 
-def check_and_fix_file(filename, autofix=False, verbose=False):
-    with open(filename, "r", encoding="utf8", errors="ignore") as file:
-        lines = file.readlines()
-        _, extension = os.path.splitext(f"./{file.name}")
-        comment_string = __get_comment_string(extension)
-        ignore_blocks = __get_ignore_blocks(extension)
-        ignore_inline = __get_inline_ignore(extension)
-        __log_verbose(f"FILE: {filename}", verbose)
+def check_lines(
+    filename,
+    lines,
+    autofix=False,
+    verbose=False,
+    report=print,
+    write=None,
+    matcher=NAME_MATCHER,
+    changed_lines=None,
+    stats=None,
+):
+    """Check (and optionally fix) lines of a file
 
+    lines can be any iterable (e.g. an open file), it's consumed lazily and
+    only one line is kept in memory at a time. Found issues are passed to
+    report as Diagnostic and RuleWarning records as soon as they're found. If
+    write is given, every line (fixed one if autofix is set) is passed to it.
+    Fixes replace exactly the reported matches, all of them in a single pass
+    over the line, so ignored spans and disabled rules are left untouched.
+    If changed_lines (a set of line numbers) is given, only these lines are
+    checked and fixed, ignored blocks are still tracked from the first line.
+    Scanned lines and rule matches are counted in stats (a FileStats).
+    Returns True if no issues were found.
+    """
+    _, extension = os.path.splitext(f"./{filename}")
+    comment_string = __get_comment_string(extension)
+    ignore_blocks = __get_ignore_blocks(extension)
+    ignore_inline = __get_inline_ignore(extension)
+    __log_verbose(f"FILE: {filename}", verbose)
+
+    lines = iter(lines)
+    first_line = next(lines, None)
     # Don't check empty files
-    if len(lines) == 0:
+    if first_line is None:
         return True
-    fixed_lines = []
+    lines = itertools.chain([first_line], lines)
     found_issues = False
+    segmenter = Segmenter(ignore_blocks, ignore_inline)
     file_ignore_pattern = rf"\s*{re.escape(comment_string)}\s*namespell:disable.*"
     line_ignore_pattern = rf".*{re.escape(comment_string)}\s*namespell:disable.*"
 
-    active_rules, are_file_rules = __get_active_rules(
-        filename, lines[0], 1, line_ignore_pattern, file_ignore_pattern
+    disabled_rules, are_file_rules = __get_disabled_rules(
+        filename,
+        first_line,
+        1,
+        line_ignore_pattern,
+        file_ignore_pattern,
+        matcher,
+        report,
     )
     # If first line contains file-wide rules, set them
-    file_rules = active_rules if are_file_rules else NAME_RULES.copy()
+    file_disabled_rules = disabled_rules if are_file_rules else NO_RULES
     # Whole file ignored
-    if file_rules == {}:
+    if len(file_disabled_rules) == len(matcher.rules):
+        if stats is not None:
+            stats.skipped = "disabled"
+        if write is not None:
+            for line in lines:
+                write(line)
         return True
+    line_number = 0
     for line_number, line in enumerate(lines, start=1):
         __log_verbose(f"LINE {line_number}", verbose)
         fixed_line = line
-        __check_block(ignore_blocks, line, verbose)
-        to_ignore = __check_inline_ignore(ignore_inline, line, verbose)
-        if blocks:
-            fixed_lines.append(fixed_line)
+        spans = list(segmenter.spans(line))
+        if not spans or (
+            changed_lines is not None and line_number not in changed_lines
+        ):
+            if write is not None:
+                write(fixed_line)
             continue
-        active_rules = file_rules
+        disabled_rules = file_disabled_rules
         if line_number != 1:
-            line_rules, _ = __get_active_rules(
-                filename, line, line_number, line_ignore_pattern, file_ignore_pattern
-            )
-            # Active rules are the rules that weren't disabled by the file-wide
-            # and inline disabled rules, in other words the intersection of
-            # active rules dicts
-            active_rules = {
-                key: line_rules[key] for key in line_rules if key in file_rules
-            }
-
-        for name, correct_format in active_rules.items():
-            pattern = re.compile(
-                rf"(?<![-_\./=\"#]){re.escape(name)}(?![-_\./=\"#])", re.IGNORECASE
+            line_disabled_rules, _ = __get_disabled_rules(
+                filename,
+                line,
+                line_number,
+                line_ignore_pattern,
+                file_ignore_pattern,
+                matcher,
+                report,
             )
-            matches = re.finditer(pattern, line)
-            for match in matches:
+            # Rules disabled both file-wide and inline, sets are only merged
+            # for the (rare) lines with an ignore statement
+            if line_disabled_rules:
+                disabled_rules = disabled_rules | line_disabled_rules
+
+        # (start, end, correct format) of the reported matches, in order
+        edits = []
+        for start, end in spans:
+            __log_verbose(f"SPAN: {start}-{end}", verbose)
+            for match, name in matcher.finditer(line, start, end):
+                if name in disabled_rules:
+                    continue
+                if stats is not None:
+                    stats.matches[name] += 1
+                correct_format = matcher.rules[name]
                 __log_verbose(f"FOUND: {match.group()} AT {match.start()}", verbose)
-                if match.group() != correct_format and match.start() not in to_ignore:
+                if match.group() != correct_format:
                     found_issues = True
-                    print(
-                        f"{filename}:{line_number}: '{match.group()}' should be '{correct_format}'"
+                    report(
+                        Diagnostic(
+                            filename,
+                            line_number,
+                            match.start() + 1,
+                            match.group(),
+                            correct_format,
+                        )
                     )
-                if autofix:
-                    fixed_line = re.sub(pattern, correct_format, fixed_line)
-        fixed_lines.append(fixed_line)
-
-    if found_issues and autofix:
-        with open(filename, "w") as file:
-            file.writelines(fixed_lines)
+                    if autofix:
+                        edits.append((match.start(), match.end(), correct_format))
+        if edits:
+            fixed_line = apply_edits(line, edits)
+        if write is not None:
+            write(fixed_line)
 
+    if stats is not None:
+        stats.lines += line_number
     return not found_issues
 
 
+def check_and_fix_file(
+    filename,
+    autofix=False,
+    verbose=False,
+    report=print,
+    matcher=NAME_MATCHER,
+    changed_lines=None,
+    stats=None,
+    diff_write=None,
+):
+    """Check (and optionally fix) a single file
+
+    The file is streamed line by line. Only if any issue was found, it's
+    streamed again with fixes to a temporary file replacing the original. If
+    diff_write is given, the file isn't modified, a unified diff of the
+    fixes is passed to it instead.
+    """
+    if diff_write is not None:
+        diff = UnifiedDiff(filename, diff_write)
+        # Lines read but not written yet, check_lines reads at most one ahead
+        originals = deque()
+
+        def read(file):
+            for line in file:
+                originals.append(line)
+                yield line
+
+        # Line endings are kept, the diff has to apply to the file as is
+        with open(filename, "r", encoding="utf8", errors="ignore", newline="") as file:
+            if stats is not None:
+                stats.bytes += os.fstat(file.fileno()).st_size
+            passed = check_lines(
+                filename,
+                read(file),
+                True,
+                verbose,
+                report,
+                lambda line: diff.add(originals.popleft(), line),
+                matcher,
+                changed_lines,
+                stats,
+            )
+        diff.close()
+        return passed
+    with open(filename, "r", encoding="utf8", errors="ignore") as file:
+        if stats is not None:
+            stats.bytes += os.fstat(file.fileno()).st_size
+        passed = check_lines(
+            filename,
+            file,
+            verbose=verbose,
+            report=report,
+            matcher=matcher,
+            changed_lines=changed_lines,
+            stats=stats,
+        )
+    if passed or not autofix:
+        return passed
+    # Only files with issues are streamed through a temporary file, issues
+    # were already reported by the check
+    with AtomicWriter(filename) as writer:
+        with open(filename, "r", encoding="utf8", errors="ignore") as file:
+            check_lines(
+                filename,
+                file,
+                True,
+                report=lambda item: None,
+                write=writer.file.write,
+                matcher=matcher,
+                changed_lines=changed_lines,
+            )
+        writer.commit()
+    return passed
+
+
+class VersionAction(argparse.Action):
+    """argparse "version" action which looks the version up only when used"""
+
+    def __init__(self, option_strings, dest, help=None):
+        super().__init__(option_strings, dest, nargs=0, help=help)
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        print(package_version())
+        parser.exit()
+
+
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="Trademark name spell checker")
     parser.add_argument(
         "-v",
         "--version",
-        action="version",
-        version=metadata.version("3mdeb-hooks"),
+        action=VersionAction,
         help="Print package version",
     )
     parser.add_argument(
@@ -274,21 +755,513 @@ def parse_args() -> argparse.Namespace:
         default=False,
         help="Automatically fix issues",
     )
-    parser.add_argument("files", nargs="+", help="File(s) to parse")
+    parser.add_argument(
+        "files",
+        nargs="*",
+        help="File(s) or directories to parse (path filters with --rev)",
+    )
     parser.add_argument(
         "--verbose", action="store_true", default=False, help="Run tool in verbose mode"
     )
-    return parser.parse_args()
+    add_jobs_argument(parser)
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        default=False,
+        help="Don't skip files which passed the check in previous runs",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=DEFAULT_CACHE_DIR,
+        help=f"Directory of the result and rules cache (default: {DEFAULT_CACHE_DIR})",
+    )
+    parser.add_argument(
+        "--diff",
+        action="store_true",
+        default=False,
+        help="Only check lines added or modified in the staged changes",
+    )
+    parser.add_argument(
+        "--diff-base",
+        metavar="BASE",
+        help="With --diff, compare the working tree to BASE instead",
+    )
+    parser.add_argument(
+        "--rules",
+        action="append",
+        default=[],
+        metavar="FILE",
+        help=f"Additional rule dictionary, applied after the user one and {CONFIG_FILE}",
+    )
+    parser.add_argument(
+        "--rev",
+        metavar="TREE-ISH",
+        help="Check all files of a git revision without checking it out",
+    )
+    parser.add_argument(
+        "--diff-output",
+        metavar="FILE",
+        help="Write a unified diff of the fixes to FILE ('-' for stdout, issues "
+        "are then printed to stderr) instead of modifying files",
+    )
+    parser.add_argument(
+        "--no-server",
+        action="store_true",
+        default=False,
+        help="Don't use a running 'namespell serve', check files in this process",
+    )
+    discovery.add_arguments(parser)
+    add_arguments(parser)
+    args = parser.parse_args()
+    if args.rev is None and not args.files:
+        parser.error("the following arguments are required: files")
+    if args.rev is not None and (args.fix or args.diff or args.diff_output):
+        parser.error("--rev can't be used with --fix, --diff or --diff-output")
+    if args.fix and args.diff_output is not None:
+        parser.error("--fix can't be used with --diff-output")
+    return args
 
 
-def main():
-    args = parse_args()
+def get_result_cache(directory=DEFAULT_CACHE_DIR, matcher=NAME_MATCHER) -> ResultCache:
+    """Cache of clean files valid for the current rules and configuration"""
+    return ResultCache(
+        os.path.join(directory, "results"),
+        config_fingerprint(
+            matcher.fingerprint,
+            sorted(COMMENT_STRINGS.items()),
+            sorted(IGNORE_BLOCKS.items()),
+            sorted(IGNORE_INLINE.items()),
+            package_version(),
+        ),
+    )
+
+
+def get_changed_lines(base=None) -> Dict[str, Set[int]]:
+    """Numbers of lines added or modified in each file, read from git diff
+
+    Staged changes are used, unless base is given, then the working tree is
+    compared to it. Paths are absolute. A single git diff is run for all
+    files.
+    """
+    toplevel = subprocess.check_output(
+        ["git", "rev-parse", "--show-toplevel"], encoding="utf8"
+    ).strip()
+    command = [
+        "git",
+        "-c",
+        "core.quotepath=off",
+        "diff",
+        "--no-color",
+        "--no-ext-diff",
+        # Paths without a/ and b/, whatever diff.noprefix and
+        # diff.mnemonicPrefix are set to
+        "--no-prefix",
+        "-U0",
+        "--cached" if base is None else base,
+    ]
+    changed_lines = {}
+    current = None
+    with subprocess.Popen(
+        command, stdout=subprocess.PIPE, encoding="utf8", errors="replace"
+    ) as process:
+        for line in process.stdout:
+            if line.startswith("+++ "):
+                path = line[4:].rstrip("\n").rstrip("\t")
+                if path == "/dev/null":
+                    current = None
+                else:
+                    path = os.path.join(toplevel, path)
+                    current = changed_lines.setdefault(os.path.normpath(path), set())
+                continue
+            match = HUNK_HEADER.match(line)
+            if match and current is not None:
+                start = int(match.group(1))
+                count = int(match.group(2)) if match.group(2) is not None else 1
+                current.update(range(start, start + count))
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, command)
+    return changed_lines
+
+
+def check_file_cached(
+    filename,
+    cache,
+    autofix=False,
+    verbose=False,
+    report=print,
+    matcher=NAME_MATCHER,
+    changed_lines=None,
+    stats=None,
+    diff_write=None,
+):
+    """check_and_fix_file which skips files that passed in a previous run
+
+    Only files which passed without any reports are cached, so warnings are
+    shown again on every run. Results of partial checks (changed_lines) are
+    not cached.
+    """
+    if changed_lines is not None and not changed_lines:
+        if stats is not None:
+            stats.skipped = "unchanged"
+        return True
+    if cache is None:
+        return check_and_fix_file(
+            filename,
+            autofix,
+            verbose,
+            report,
+            matcher,
+            changed_lines,
+            stats,
+            diff_write,
+        )
+    _, extension = os.path.splitext(filename)
+    # Ignore handling depends on the extension, content alone isn't enough
+    key = cache.file_key(filename, salt=extension)
+    if cache.contains(key):
+        __log_verbose(f"CACHED: {filename}", verbose)
+        if stats is not None:
+            stats.skipped = "cached"
+        return True
+    reported = False
+
+    def report_and_track(item):
+        nonlocal reported
+        reported = True
+        report(item)
+
+    passed = check_and_fix_file(
+        filename,
+        autofix,
+        verbose,
+        report_and_track,
+        matcher,
+        changed_lines,
+        stats,
+        diff_write,
+    )
+    if passed and not reported and changed_lines is None:
+        cache.add(key)
+    return passed
+
+
+class GitBlobReader:
+    """Reads blob contents through a single 'git cat-file --batch' process"""
+
+    def __init__(self):
+        self.process = subprocess.Popen(
+            ["git", "cat-file", "--batch"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+        )
+
+    def read(self, object_name) -> bytes:
+        self.process.stdin.write(object_name.encode() + b"\n")
+        self.process.stdin.flush()
+        header = self.process.stdout.readline().split()
+        if len(header) != 3:
+            raise KeyError(object_name)
+        content = self.process.stdout.read(int(header[2]))
+        # Contents are followed by a newline
+        self.process.stdout.read(1)
+        return content
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.process.stdin.close()
+        self.process.stdout.close()
+        self.process.wait()
+        return False
+
+
+def list_blobs(rev, paths=()) -> List[Tuple[str, str]]:
+    """(path, blob id) of all regular files in a git revision"""
+    output = subprocess.check_output(
+        ["git", "ls-tree", "-r", "-z", rev, "--", *paths]
+    ).decode("utf8", errors="replace")
+    blobs = []
+    for entry in output.split("\0"):
+        if not entry:
+            continue
+        info, path = entry.split("\t", 1)
+        mode, object_type, object_name = info.split(" ")
+        # Skip symlinks and submodules
+        if object_type == "blob" and mode != "120000":
+            blobs.append((path, object_name))
+    return blobs
+
+
+# Checks content of a single blob for --rev. Pool workers get no matcher and
+# load it themselves, like in __check_file_collect
+def __check_blob(item, matcher=None, config=(), cache_dir=None, collect_stats=False):
+    path, content = item
+    file_stats = FileStats(path) if collect_stats else None
+    with timed(file_stats):
+        if matcher is None:
+            matcher = __worker_matcher(config, cache_dir)
+        reports = []
+        if content is None:
+            if file_stats is not None:
+                file_stats.skipped = "binary"
+            return True, reports, file_stats
+        if file_stats is not None:
+            file_stats.bytes = len(content)
+        # Split lines like a file opened in text mode does, str.splitlines()
+        # also splits on form feeds and other separators
+        lines = io.StringIO(content.decode("utf8", errors="ignore"), newline="")
+        passed = check_lines(
+            path, lines, report=reports.append, matcher=matcher, stats=file_stats
+        )
+    return passed, reports, file_stats
+
+
+def check_revision(
+    rev,
+    paths=(),
+    cache=None,
+    jobs=1,
+    matcher=NAME_MATCHER,
+    config=(),
+    cache_dir=None,
+    stats=None,
+) -> bool:
+    """Check all files of a git revision, reading them from the object store
+
+    Identical files (same blob and extension) are checked once, clean ones
+    are remembered in the result cache by blob id so they aren't even read in
+    subsequent runs. Binary files (content None for the workers) are skipped.
+    """
+    blobs = list_blobs(rev, paths)
+    # Key of every (blob, extension) pair, the result depends on both
+    keys = [(object_name, os.path.splitext(path)[1]) for path, object_name in blobs]
+    results = {}
+    to_check = {}
+    for (path, _), key in zip(blobs, keys):
+        if key in results or key in to_check:
+            if stats is not None:
+                stats.skip(path, "duplicate")
+            continue
+        cache_key = None
+        if cache is not None:
+            cache_key = config_fingerprint("blob", *key)
+            if cache.contains(cache_key):
+                results[key] = (True, [])
+                if stats is not None:
+                    stats.skip(path, "cached")
+                continue
+        to_check[key] = (path, cache_key)
+
+    def contents(reader):
+        for (object_name, _), (path, _) in to_check.items():
+            content = reader.read(object_name)
+            # Same heuristic as git uses to detect binary files
+            if b"\0" in content[:8000]:
+                content = None
+            yield path, content
+
+    with GitBlobReader() as reader:
+        if jobs == 1:
+            check = functools.partial(
+                __check_blob, matcher=matcher, collect_stats=stats is not None
+            )
+        else:
+            check = functools.partial(
+                __check_blob,
+                config=config,
+                cache_dir=cache_dir,
+                collect_stats=stats is not None,
+            )
+        for key, (passed, reports, file_stats) in zip(
+            to_check, imap_ordered(check, contents(reader), jobs)
+        ):
+            results[key] = (passed, reports)
+            if file_stats is not None:
+                stats.add(file_stats)
+            cache_key = to_check[key][1]
+            if cache_key is not None and passed and not reports:
+                cache.add(cache_key)
+
     all_passed = True
-    for filename in args.files:
-        if not check_and_fix_file(filename, args.fix, args.verbose):
+    for (path, _), key in zip(blobs, keys):
+        passed, reports = results[key]
+        for item in reports:
+            print(item._replace(filename=path))
+        if not passed:
             all_passed = False
-    if not all_passed:
-        sys.exit(1)
+    return all_passed
+
+
+# Worker entry point, reports are collected and printed by the parent process
+# so the output doesn't depend on the order in which the workers finish
+def __check_file_collect(
+    item,
+    cache=None,
+    autofix=False,
+    verbose=False,
+    config=(),
+    cache_dir=None,
+    collect_stats=False,
+    diff=False,
+):
+    filename, changed_lines = item
+    file_stats = FileStats(filename) if collect_stats else None
+    with timed(file_stats):
+        # Workers load the matcher themselves (from the cache when available)
+        # instead of receiving a pickled copy with every file
+        matcher = __worker_matcher(config, cache_dir)
+        reports = []
+        patch = []
+        added = cache.added if cache is not None else 0
+        passed = check_file_cached(
+            filename,
+            cache,
+            autofix,
+            verbose,
+            reports.append,
+            matcher,
+            changed_lines,
+            file_stats,
+            patch.append if diff else None,
+        )
+    added = cache is not None and cache.added != added
+    return passed, reports, added, "".join(patch), file_stats
+
+
+def __use_server(args, stats) -> bool:
+    """Whether a running server can check the files instead of this process
+
+    Only plain checks of files (with or without fixing) are sent to it.
+    """
+    if args.no_server or args.rev is not None or args.diff or args.verbose:
+        return False
+    if args.diff_output is not None:
+        return False
+    # Statistics and profiles have to measure this process
+    if stats is not None or args.profile:
+        return False
+    return os.path.exists(os.path.join(args.cache_dir, SERVER_SOCKET))
+
+
+def main():
+    # "namespell serve [options]", everything else is a check
+    if sys.argv[1:2] == ["serve"]:
+        from hooks import namespell_server
+
+        namespell_server.main(sys.argv[2:])
+        return
+    args = parse_args()
+    with instrument("namespell", args) as stats:
+        config = tuple(find_config_files(args.rules))
+        files = discovery.discover(args, EXTENSIONS, stats)
+        if __use_server(args, stats):
+            from hooks import namespell_server
+
+            files = list(files)
+            passed = namespell_server.check_with_server(
+                files, args.fix, not args.no_cache, config, args.cache_dir
+            )
+            if passed is not None:
+                sys.exit(0 if passed else 1)
+        cache_dir = None if args.no_cache else args.cache_dir
+        try:
+            matcher = load_matcher(config, cache_dir)
+        except ConfigError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+        cache = None if args.no_cache else get_result_cache(args.cache_dir, matcher)
+        if args.rev is not None:
+            try:
+                passed = check_revision(
+                    args.rev,
+                    args.files,
+                    cache,
+                    args.jobs,
+                    matcher,
+                    config,
+                    cache_dir,
+                    stats,
+                )
+            except (OSError, KeyError, subprocess.CalledProcessError) as e:
+                print(f"Error: failed to read {args.rev}: {e}", file=sys.stderr)
+                sys.exit(1)
+            if cache is not None and cache.added:
+                cache.prune()
+            sys.exit(0 if passed else 1)
+        changed_lines = None
+        if args.diff:
+            try:
+                changed_lines = get_changed_lines(args.diff_base)
+            except (OSError, subprocess.CalledProcessError) as e:
+                print(f"Error: failed to read the diff: {e}", file=sys.stderr)
+                sys.exit(1)
+        # (filename, changed lines or None to check the whole file)
+        items = (
+            (
+                filename,
+                None
+                if changed_lines is None
+                else changed_lines.get(os.path.abspath(filename), set()),
+            )
+            for filename in files
+        )
+        report = print
+        diff_file = None
+        diff_write = None
+        if args.diff_output == "-":
+            # Keep the patch on stdout clean
+            report = functools.partial(print, file=sys.stderr)
+            diff_write = sys.stdout.write
+        elif args.diff_output is not None:
+            diff_file = open(args.diff_output, "w")
+            diff_write = diff_file.write
+        all_passed = True
+        if args.jobs == 1:
+            for filename, file_changed_lines in items:
+                with measure(stats, filename) as file_stats:
+                    if not check_file_cached(
+                        filename,
+                        cache,
+                        args.fix,
+                        args.verbose,
+                        report,
+                        matcher,
+                        file_changed_lines,
+                        file_stats,
+                        diff_write,
+                    ):
+                        all_passed = False
+        else:
+            check = functools.partial(
+                __check_file_collect,
+                cache=cache,
+                autofix=args.fix,
+                verbose=args.verbose,
+                config=config,
+                cache_dir=cache_dir,
+                collect_stats=stats is not None,
+                diff=diff_write is not None,
+            )
+            for passed, reports, added, patch, file_stats in imap_ordered(
+                check, items, args.jobs
+            ):
+                if file_stats is not None:
+                    stats.add(file_stats)
+                for item in reports:
+                    report(item)
+                if patch:
+                    diff_write(patch)
+                if not passed:
+                    all_passed = False
+                if added:
+                    cache.added += 1
+        if diff_file is not None:
+            diff_file.close()
+        if cache is not None and cache.added:
+            cache.prune()
+        if not all_passed:
+            sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -297,3 +1270,7 @@ if __name__ == "__main__":
 
 class RegexParseError(Exception):
     pass
+
+
+class ConfigError(Exception):
+    pass
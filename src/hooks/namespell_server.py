@@ -0,0 +1,359 @@
+"""Long-running namespell server keeping the compiled rules warm
+
+The server reads JSON requests, one per line, from a Unix socket in the
+namespell cache directory (or from stdin with --stdio) and writes one JSON
+response line for each of them:
+
+    {"files": ["README.md"], "fix": false, "cache": true, "cwd": "/repo"}
+    {"filename": "README.md", "text": "...", "fix": true}
+    {"command": "ping"}
+    {"command": "shutdown"}
+
+Check responses contain "passed" and "reports", a list of diagnostics
+({"kind": "diagnostic", "file", "line", "column", "found", "expected"}) and
+rule warnings ({"kind": "warning", "file", "line", "rule", "available"}) in
+the order they were found. Fixed text of "text" requests is returned in
+"text" instead of being written anywhere. Requests may carry the
+"fingerprint" of the client's configuration, they're refused if it doesn't
+match the server's one, so a client never gets results for other rules.
+"""
+
+import argparse
+import io
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+
+from hooks import namespell
+from hooks.cache import config_fingerprint, init_cache_dir
+
+# Seconds to wait for the server to accept a connection and to respond,
+# clients check files themselves when it doesn't
+CONNECT_TIMEOUT = 1.0
+RESPONSE_TIMEOUT = 30.0
+# Seconds between checks whether the server should stop
+POLL_INTERVAL = 0.5
+
+
+def socket_path(cache_dir) -> str:
+    return os.path.join(cache_dir, namespell.SERVER_SOCKET)
+
+
+def fingerprint(config) -> str:
+    """Identity of rule dictionaries in config, the code and the interpreter
+
+    Only file states are compared, so it's cheap enough to be computed by
+    every client. Raises OSError if any of the dictionaries can't be read.
+    """
+    state = [
+        (os.path.abspath(path), os.stat(path).st_mtime_ns, os.stat(path).st_size)
+        for path in config
+    ]
+    code = os.stat(namespell.__file__).st_mtime_ns
+    return config_fingerprint(state, code, sys.hexversion)
+
+
+def report_to_dict(item) -> dict:
+    if isinstance(item, namespell.Diagnostic):
+        return {
+            "kind": "diagnostic",
+            "file": item.filename,
+            "line": item.line,
+            "column": item.column,
+            "found": item.found,
+            "expected": item.expected,
+        }
+    return {
+        "kind": "warning",
+        "file": item.filename,
+        "line": item.line,
+        "rule": item.rule,
+        "available": list(item.available),
+    }
+
+
+def report_from_dict(data):
+    """Diagnostic or RuleWarning printed exactly as by a local check"""
+    if data["kind"] == "diagnostic":
+        return namespell.Diagnostic(
+            data["file"], data["line"], data["column"], data["found"], data["expected"]
+        )
+    return namespell.RuleWarning(
+        data["file"], data["line"], data["rule"], tuple(data["available"])
+    )
+
+
+class Checker:
+    """Compiled rules and the result cache, reloaded when the rules change"""
+
+    def __init__(self, rules=(), cache_dir=namespell.DEFAULT_CACHE_DIR):
+        self.rules = list(rules)
+        self.cache_dir = cache_dir
+        self.fingerprint = None
+        self.stopped = False
+        # Connections are handled in threads, requests one at a time
+        self.lock = threading.Lock()
+        self.last_request = time.monotonic()
+        self.refresh()
+
+    def refresh(self):
+        config = tuple(namespell.find_config_files(self.rules))
+        current = fingerprint(config)
+        if current != self.fingerprint:
+            self.matcher = namespell.load_matcher(config, self.cache_dir)
+            self.cache = namespell.get_result_cache(self.cache_dir, self.matcher)
+            self.fingerprint = current
+
+    def handle(self, request) -> dict:
+        command = request.get("command", "check")
+        if command in ("ping", "shutdown"):
+            self.stopped = command == "shutdown"
+            return {"fingerprint": self.fingerprint}
+        if command != "check":
+            return {"error": f"unknown command: {command}"}
+        try:
+            self.refresh()
+        except (OSError, namespell.ConfigError) as e:
+            return {"error": str(e)}
+        client_fingerprint = request.get("fingerprint")
+        if client_fingerprint is not None and client_fingerprint != self.fingerprint:
+            return {"error": "fingerprint mismatch", "fingerprint": self.fingerprint}
+        if "text" in request:
+            return self.check_text(request)
+        return self.check_files(request)
+
+    def check_text(self, request) -> dict:
+        reports = []
+        lines = [] if request.get("fix") else None
+        passed = namespell.check_lines(
+            request.get("filename", ""),
+            io.StringIO(request["text"], newline=""),
+            autofix=bool(request.get("fix")),
+            report=lambda item: reports.append(report_to_dict(item)),
+            write=None if lines is None else lines.append,
+            matcher=self.matcher,
+        )
+        response = {"passed": passed, "reports": reports}
+        if lines is not None:
+            response["text"] = "".join(lines)
+        return response
+
+    def check_files(self, request) -> dict:
+        cwd = request.get("cwd", os.getcwd())
+        cache = self.cache if request.get("cache", True) else None
+        reports = []
+        errors = []
+        all_passed = True
+        for filename in request.get("files", []):
+            file_reports = []
+            try:
+                passed = namespell.check_file_cached(
+                    os.path.join(cwd, filename),
+                    cache,
+                    bool(request.get("fix")),
+                    report=file_reports.append,
+                    matcher=self.matcher,
+                )
+            except OSError as e:
+                errors.append(f"{filename}: {e}")
+                passed = False
+            all_passed = all_passed and passed
+            # Paths are reported as the client passed them
+            reports.extend(
+                report_to_dict(item._replace(filename=filename))
+                for item in file_reports
+            )
+        if cache is not None and cache.added:
+            cache.prune()
+            cache.added = 0
+        return {"passed": all_passed, "reports": reports, "errors": errors}
+
+
+def handle_line(checker, line) -> dict:
+    try:
+        request = json.loads(line)
+        if not isinstance(request, dict):
+            raise ValueError("request has to be an object")
+    except ValueError as e:
+        return {"error": f"invalid request: {e}"}
+    with checker.lock:
+        checker.last_request = time.monotonic()
+        return checker.handle(request)
+
+
+def serve_stdio(checker, stdin=sys.stdin, stdout=sys.stdout):
+    for line in stdin:
+        if not line.strip():
+            continue
+        response = handle_line(checker, line)
+        stdout.write(json.dumps(response) + "\n")
+        stdout.flush()
+        if checker.stopped:
+            break
+
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Handles every connection in a thread, each may send any number of
+    requests, so a connection kept open (e.g. by an editor) doesn't block
+    other clients"""
+
+    daemon_threads = True
+
+    def __init__(self, path, checker, idle_timeout=None):
+        self.checker = checker
+        self.idle_timeout = idle_timeout
+        self.timeout = POLL_INTERVAL
+        super().__init__(path, RequestHandler)
+
+    def handle_timeout(self):
+        if (
+            self.idle_timeout is not None
+            and time.monotonic() - self.checker.last_request > self.idle_timeout
+        ):
+            self.checker.stopped = True
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            response = handle_line(self.server.checker, line)
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+            self.wfile.flush()
+            if self.server.checker.stopped:
+                return
+
+
+def __connect(path) -> socket.socket:
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.settimeout(CONNECT_TIMEOUT)
+        client.connect(path)
+    except OSError:
+        client.close()
+        raise
+    return client
+
+
+def request(cache_dir, data) -> dict:
+    """Send a request to the server using cache_dir, raises OSError if there
+    is no server, the connection fails or the server doesn't respond in
+    RESPONSE_TIMEOUT seconds"""
+    with __connect(socket_path(cache_dir)) as client:
+        client.settimeout(RESPONSE_TIMEOUT)
+        client.sendall(json.dumps(data).encode() + b"\n")
+        with client.makefile("rb") as response:
+            line = response.readline()
+    if not line:
+        raise ConnectionError("server closed the connection")
+    return json.loads(line)
+
+
+def check_with_server(files, fix, cache, config, cache_dir):
+    """Check files by a running server, None if there is no usable one
+
+    The caller should then check the files itself. Otherwise reports are
+    printed like by a local check and the result is returned.
+    """
+    path = socket_path(cache_dir)
+    if not os.path.exists(path):
+        return None
+    try:
+        response = request(
+            cache_dir,
+            {
+                "files": list(files),
+                "fix": fix,
+                "cache": cache,
+                "cwd": os.getcwd(),
+                "fingerprint": fingerprint(config),
+            },
+        )
+    except (OSError, ValueError):
+        return None
+    if "error" in response:
+        return None
+    for data in response["reports"]:
+        print(report_from_dict(data))
+    for error in response["errors"]:
+        print(f"Error: {error}", file=sys.stderr)
+    return response["passed"]
+
+
+def run_server(path, checker, idle_timeout=None):
+    """Serve on the Unix socket path until shut down or without requests for
+    idle_timeout seconds"""
+    if os.path.exists(path):
+        try:
+            __connect(path).close()
+        except OSError:
+            # Left behind by a server which didn't exit cleanly
+            os.remove(path)
+        else:
+            raise RuntimeError(f"a server is already running on {path}")
+    with Server(path, checker, idle_timeout) as server:
+        try:
+            while not checker.stopped:
+                server.handle_request()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.remove(path)
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="namespell serve",
+        description="Keep namespell rules loaded and check files on request",
+    )
+    parser.add_argument(
+        "--stdio",
+        action="store_true",
+        default=False,
+        help="Read requests from stdin and write responses to stdout instead "
+        "of listening on a socket",
+    )
+    parser.add_argument(
+        "--rules",
+        action="append",
+        default=[],
+        metavar="FILE",
+        help="Additional rule dictionary, like in namespell",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=namespell.DEFAULT_CACHE_DIR,
+        help="Directory of the caches and the server socket "
+        f"(default: {namespell.DEFAULT_CACHE_DIR})",
+    )
+    parser.add_argument(
+        "--idle-timeout",
+        type=float,
+        metavar="SECONDS",
+        help="Exit after SECONDS without any connection (default: never)",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        checker = Checker(args.rules, args.cache_dir)
+    except (OSError, namespell.ConfigError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    if args.stdio:
+        serve_stdio(checker)
+        return
+    path = socket_path(args.cache_dir)
+    try:
+        init_cache_dir(args.cache_dir)
+        run_server(path, checker, args.idle_timeout)
+    except (OSError, RuntimeError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,54 @@
+"""Helpers for spreading per-file hook work over a pool of worker processes"""
+
+import argparse
+import os
+from collections import deque
+
+
+def jobs_type(value) -> int:
+    """argparse type for --jobs: a positive number or "auto" (all CPUs)"""
+    if value == "auto":
+        return os.cpu_count() or 1
+    try:
+        jobs = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid jobs value: '{value}'")
+    if jobs < 1:
+        raise argparse.ArgumentTypeError("jobs has to be a positive number")
+    return jobs
+
+
+def add_jobs_argument(parser):
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=jobs_type,
+        default=1,
+        metavar="N|auto",
+        help="Number of worker processes, 'auto' uses all CPUs (default: 1)",
+    )
+
+
+def imap_ordered(function, iterable, jobs=1):
+    """Yield function(item) for every item, in input order
+
+    With more than one job items are processed by a process pool. Only a
+    bounded number of items is in flight at once, so iterable may be a lazy
+    generator and results are available before it is exhausted.
+    """
+    if jobs <= 1:
+        for item in iterable:
+            yield function(item)
+        return
+    # Imported only when needed, it noticeably slows down the start up
+    from concurrent.futures import ProcessPoolExecutor
+
+    window = jobs * 4
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        pending = deque()
+        for item in iterable:
+            pending.append(executor.submit(function, item))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
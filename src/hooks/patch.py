@@ -0,0 +1,113 @@
+"""Streaming unified diff of files fixed line by line"""
+
+from collections import deque
+
+NO_NEWLINE = "\\ No newline at end of file\n"
+
+
+def apply_edits(line, edits) -> str:
+    """line with (start, end, replacement) edits applied in a single pass
+
+    Edits have to be sorted by position and can't overlap.
+    """
+    if not edits:
+        return line
+    parts = []
+    position = 0
+    for start, end, replacement in edits:
+        parts.append(line[position:start])
+        parts.append(replacement)
+        position = end
+    parts.append(line[position:])
+    return "".join(parts)
+
+
+class UnifiedDiff:
+    """Writes a unified diff of a file whose lines are fixed one by one
+
+    Lines (with their line endings) are fed in order as (old, new) pairs with
+    add() and hunks are written as soon as they're complete, so at most
+    2 * context unchanged lines are kept in memory. Changes separated by at
+    most 2 * context lines share a hunk, like in diff -u. Nothing is written
+    if no line changed. Paths get a/ and b/ prefixes, so the output applies
+    with git apply or patch -p1.
+    """
+
+    def __init__(self, filename, write, context=3):
+        self.filename = filename
+        self.write = write
+        self.context = context
+        self.number = 0
+        self.header_written = False
+        # Unchanged lines which may precede the next hunk
+        self.before = deque(maxlen=context)
+        # (prefix, line) of the open hunk, None if there is none
+        self.hunk = None
+        self.hunk_start = 0
+        # Added lines of the current run of changed lines, they follow the
+        # removed ones
+        self.added = []
+        # Unchanged lines since the last change in the open hunk
+        self.trailing = 0
+
+    def add(self, old, new):
+        self.number += 1
+        if old == new:
+            if self.hunk is None:
+                self.before.append(old)
+                return
+            self.__flush_added()
+            self.hunk.append((" ", old))
+            self.trailing += 1
+            if self.trailing > 2 * self.context:
+                self.__write_hunk()
+            return
+        if self.hunk is None:
+            self.hunk = [(" ", line) for line in self.before]
+            self.hunk_start = self.number - len(self.before)
+            self.before.clear()
+        self.hunk.append(("-", old))
+        self.added.append(new)
+        self.trailing = 0
+
+    @staticmethod
+    def __range(start, length) -> str:
+        # Same as difflib and diff -u: the length is omitted if it's 1
+        if length == 1:
+            return str(start)
+        if length == 0:
+            start -= 1
+        return f"{start},{length}"
+
+    def close(self):
+        if self.hunk is not None:
+            self.__flush_added()
+            self.__write_hunk()
+
+    def __flush_added(self):
+        self.hunk.extend(("+", line) for line in self.added)
+        self.added = []
+
+    def __write_hunk(self):
+        # Unchanged lines beyond the context end the hunk, the last ones may
+        # precede the next one
+        excess = max(self.trailing - self.context, 0)
+        lines = self.hunk[: len(self.hunk) - excess]
+        self.before.extend(line for _, line in self.hunk[len(lines) :])
+        self.hunk = None
+        self.trailing = 0
+
+        if not self.header_written:
+            self.write(f"--- a/{self.filename}\n+++ b/{self.filename}\n")
+            self.header_written = True
+        old_length = sum(1 for prefix, _ in lines if prefix != "+")
+        new_length = sum(1 for prefix, _ in lines if prefix != "-")
+        self.write(
+            f"@@ -{self.__range(self.hunk_start, old_length)} "
+            f"+{self.__range(self.hunk_start, new_length)} @@\n"
+        )
+        for prefix, line in lines:
+            if line.endswith(("\n", "\r")):
+                self.write(prefix + line)
+            else:
+                self.write(prefix + line + "\n" + NO_NEWLINE)
@@ -2,63 +2,231 @@
 """Replace hyphen-like characters with HYPHEN-MINUS (U+002D) in files."""
 
 import argparse
+import functools
+import mmap
+import os
+import re
 import sys
+import unicodedata
 from pathlib import Path
 
+from hooks import discovery
+from hooks.fileio import AtomicWriter
+from hooks.parallel import add_jobs_argument, imap_ordered
+from hooks.stats import FileStats, add_arguments, instrument, timed
+
+# Hyphen-like characters replaced with HYPHEN-MINUS (U+002D)
+HYPHEN_LIKE = [
+    "\u2014",  # EM DASH (—)
+    "\u2013",  # EN DASH (–)
+    "\u2212",  # MINUS SIGN (−)
+    "\u2010",  # HYPHEN (‐)
+    "\u2011",  # NON-BREAKING HYPHEN (‑)
+    "\u2012",  # FIGURE DASH (‒)
+    "\u2015",  # HORIZONTAL BAR (―)
+    "\uFE58",  # SMALL EM DASH (﹘)
+    "\uFE63",  # SMALL HYPHEN-MINUS (﹣)
+    "\uFF0D",  # FULLWIDTH HYPHEN-MINUS (－)
+]
+# The characters encoded in UTF-8, they're searched and replaced in raw bytes.
+# UTF-8 is self-synchronizing, so an encoded character can't match in the
+# middle of another one.
+ENCODED_NAMES = {char.encode("utf-8"): unicodedata.name(char) for char in HYPHEN_LIKE}
+ENCODED_PATTERN = re.compile(b"|".join(map(re.escape, ENCODED_NAMES)))
+# UTF-8 lead bytes of the characters above (0xE2 and 0xEF), content without
+# them can't contain any and doesn't have to be searched
+LEAD_BYTES = sorted({encoded[:1] for encoded in ENCODED_NAMES})
+# Files of at least this size are memory-mapped instead of read
+MMAP_THRESHOLD = 16 * 1024 * 1024
+# Fixed content is processed and written in chunks of about this size
+CHUNK_SIZE = 1024 * 1024
+
+
+def contains_hyphen_like(data) -> bool:
+    """Check raw UTF-8 bytes (or an mmap) for hyphen-like characters"""
+    # find() instead of "in", which scans an mmap byte by byte in Python
+    if all(data.find(lead_byte) == -1 for lead_byte in LEAD_BYTES):
+        return False
+    return ENCODED_PATTERN.search(data) is not None
+
+
+def count_newlines(data, start=0, end=None) -> int:
+    """Count newlines in data[start:end], mmap objects have no count()"""
+    end = len(data) if end is None else end
+    return sum(
+        data[position : min(position + CHUNK_SIZE, end)].count(b"\n")
+        for position in range(start, end, CHUNK_SIZE)
+    )
+
+
+def find_hyphen_like(data):
+    """Yield (line, column, character name) of every hyphen-like character
+
+    data are raw UTF-8 bytes (or an mmap), only the beginnings of lines
+    containing the characters are decoded to count the columns.
+    """
+    line_number = 1
+    line_start = 0
+    for match in ENCODED_PATTERN.finditer(data):
+        newlines = count_newlines(data, line_start, match.start())
+        if newlines:
+            line_number += newlines
+            line_start = data.rfind(b"\n", line_start, match.start()) + 1
+        prefix = data[line_start : match.start()].decode("utf-8", errors="replace")
+        yield line_number, len(prefix) + 1, ENCODED_NAMES[match.group()]
+
+
+def __replace_all(data):
+    """data (text or UTF-8 bytes) with hyphen-like characters replaced
+
+    Bytes are fixed by a single ENCODED_PATTERN substitution. Text is fixed
+    by one str.replace() pass per character present, which is a few times
+    faster than a single substitution or str.translate() (those handle
+    decoded text match by match or character by character), see
+    benchmarks/replace.py.
+    """
+    if isinstance(data, bytes):
+        return ENCODED_PATTERN.sub(b"\x2D", data)
+    for char in HYPHEN_LIKE:
+        if char in data:
+            data = data.replace(char, "\u002D")
+    return data
+
+
+def replace_in_text(text) -> str:
+    """Replace hyphen-like characters in already decoded text"""
+    return __replace_all(text)
 
-def replace_em_dash(file_path):
-    """Replace hyphen-like characters with standard hyphens in a file."""
-    try:
-        content = file_path.read_text(encoding="utf-8")
-        original_content = content
-
-        # Replace various hyphen-like characters with HYPHEN-MINUS (U+002D)
-        replacements = [
-            ("\u2014", "\u002D"),  # EM DASH (—) → HYPHEN-MINUS (-)
-            ("\u2013", "\u002D"),  # EN DASH (–) → HYPHEN-MINUS (-)
-            ("\u2212", "\u002D"),  # MINUS SIGN (−) → HYPHEN-MINUS (-)
-            ("\u2010", "\u002D"),  # HYPHEN (‐) → HYPHEN-MINUS (-)
-            ("\u2011", "\u002D"),  # NON-BREAKING HYPHEN (‑) → HYPHEN-MINUS (-)
-            ("\u2012", "\u002D"),  # FIGURE DASH (‒) → HYPHEN-MINUS (-)
-            ("\u2015", "\u002D"),  # HORIZONTAL BAR (―) → HYPHEN-MINUS (-)
-            ("\uFE58", "\u002D"),  # SMALL EM DASH (﹘) → HYPHEN-MINUS (-)
-            ("\uFE63", "\u002D"),  # SMALL HYPHEN-MINUS (﹣) → HYPHEN-MINUS (-)
-            ("\uFF0D", "\u002D"),  # FULLWIDTH HYPHEN-MINUS (－) → HYPHEN-MINUS (-)
-        ]
-
-        for old_char, new_char in replacements:
-            content = content.replace(old_char, new_char)
-
-        if content != original_content:
-            file_path.write_text(content, encoding="utf-8")
-            print(f"Fixed hyphen-like characters in: {file_path}")
-            return 1  # File was modified
 
+def fixed_chunks(data):
+    """Yield data with hyphen-like characters replaced, in chunks
+
+    Chunks end at character boundaries, so at most CHUNK_SIZE bytes (plus
+    one character) are processed at once. Raises UnicodeDecodeError if data
+    isn't valid UTF-8, the encoded characters could be a part of other text
+    then.
+    """
+    start = 0
+    while start < len(data):
+        end = min(start + CHUNK_SIZE, len(data))
+        # Don't split a character, skip UTF-8 continuation bytes
+        while end < len(data) and 0x80 <= data[end] < 0xC0:
+            end += 1
+        chunk = data[start:end]
+        chunk.decode("utf-8")
+        yield __replace_all(chunk)
+        start = end
+
+
+def __print_error(message):
+    print(message, file=sys.stderr)
+
+
+def __replace_in_data(file_path, data, stats, check, report):
+    if stats is not None:
+        stats.bytes += len(data)
+        stats.lines += count_newlines(data)
+    if not contains_hyphen_like(data):
         return 0  # No changes needed
 
+    if check or stats is not None:
+        for line, column, name in find_hyphen_like(data):
+            if stats is not None:
+                stats.matches[name] += 1
+            if check:
+                report(f"{file_path}:{line}:{column}: {name} should be HYPHEN-MINUS")
+        if check:
+            return 1
+
+    # Fixed content is streamed to a temporary file which replaces the
+    # original one, nothing is written if decoding fails
+    with AtomicWriter(file_path, "wb") as writer:
+        for chunk in fixed_chunks(data):
+            writer.file.write(chunk)
+        writer.commit()
+    report(f"Fixed hyphen-like characters in: {file_path}")
+    return 1  # File was modified
+
+
+def replace_em_dash(
+    file_path, stats=None, check=False, report=print, report_error=__print_error
+):
+    """Replace hyphen-like characters with standard hyphens in a file.
+
+    With check set the file isn't modified, positions of the characters are
+    reported instead. Large files are memory-mapped, files without any of
+    the characters are never decoded.
+    """
+    try:
+        with open(file_path, "rb") as file:
+            if os.fstat(file.fileno()).st_size < MMAP_THRESHOLD:
+                return __replace_in_data(file_path, file.read(), stats, check, report)
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return __replace_in_data(file_path, data, stats, check, report)
+
     except Exception as e:
-        print(f"Error processing {file_path}: {e}", file=sys.stderr)
+        report_error(f"Error processing {file_path}: {e}")
         return 1
 
 
+# Worker entry point, output is collected and printed by the parent process
+# so it doesn't depend on the order in which the workers finish
+def __replace_collect(file_path, check=False, collect_stats=False):
+    output = []
+    file_stats = FileStats(file_path) if collect_stats else None
+    path = Path(file_path)
+    if not path.is_file():
+        if file_stats is not None:
+            file_stats.skipped = "not a file"
+        return 0, output, file_stats
+    with timed(file_stats):
+        modified = replace_em_dash(
+            path,
+            file_stats,
+            check,
+            lambda message: output.append((False, message)),
+            lambda message: output.append((True, message)),
+        )
+    return modified, output, file_stats
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Replace hyphen-like characters with HYPHEN-MINUS"
     )
-    parser.add_argument("files", nargs="*", help="Files to process")
+    parser.add_argument("files", nargs="*", help="Files or directories to process")
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        default=False,
+        help="Only report positions of hyphen-like characters, don't modify files",
+    )
+    add_jobs_argument(parser)
+    discovery.add_arguments(parser)
+    add_arguments(parser)
     args = parser.parse_args()
 
-    modified_count = 0
-    for file_path in args.files:
-        path = Path(file_path)
-        if path.exists() and path.is_file():
-            modified_count += replace_em_dash(path)
+    with instrument("replace-hyphen-like", args) as stats:
+        process = functools.partial(
+            __replace_collect, check=args.check, collect_stats=stats is not None
+        )
+        modified_count = 0
+        files = discovery.discover(args, discovery.MARKDOWN_EXTENSIONS, stats)
+        for modified, output, file_stats in imap_ordered(process, files, args.jobs):
+            for is_error, message in output:
+                print(message, file=sys.stderr if is_error else sys.stdout)
+            if file_stats is not None:
+                stats.add(file_stats)
+            modified_count += modified
 
-    if modified_count > 0:
-        print(f"Modified {modified_count} file(s)")
-        sys.exit(1)  # Exit with error code to fail pre-commit
+        if modified_count > 0:
+            if args.check:
+                print(f"Found hyphen-like characters in {modified_count} file(s)")
+            else:
+                print(f"Modified {modified_count} file(s)")
+            sys.exit(1)  # Exit with error code to fail pre-commit
 
-    sys.exit(0)
+        sys.exit(0)
 
 
 if __name__ == "__main__":
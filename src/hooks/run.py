@@ -0,0 +1,277 @@
+"""Run several hooks over the same files in a single process
+
+Each file is read and decoded once, all enabled hooks work on the same text
+and their fixes are written back in a single write. Hooks are applied in the
+order in which they're listed in pre-commit configurations (namespell, then
+replace-hyphen-like), so the result is the same as when running them one by
+one, except that line endings are always preserved.
+"""
+
+import argparse
+import functools
+import io
+import re
+import sys
+
+from hooks import discovery, namespell
+from hooks.fileio import AtomicWriter
+from hooks.parallel import add_jobs_argument, imap_ordered
+from hooks.replace_hyphen_like import (
+    contains_hyphen_like,
+    count_newlines,
+    find_hyphen_like,
+    replace_in_text,
+)
+from hooks.stats import FileStats, add_arguments, instrument, timed
+
+HOOKS = ["namespell", "replace-hyphen-like"]
+# Same files as replace-hyphen-like is run on in .pre-commit-hooks.yaml
+HYPHEN_FILES = r"\.(md|markdown)$"
+
+
+def hooks_type(value) -> list:
+    """argparse type for a comma separated list of hooks"""
+    hooks = [hook.strip() for hook in value.split(",") if hook.strip()]
+    for hook in hooks:
+        if hook not in HOOKS:
+            raise argparse.ArgumentTypeError(
+                f"unknown hook: '{hook}' (available: {', '.join(HOOKS)})"
+            )
+    return hooks
+
+
+def run_file(
+    filename,
+    hooks,
+    fix=False,
+    check=False,
+    hyphen_files=re.compile(HYPHEN_FILES),
+    matcher=namespell.NAME_MATCHER,
+    report=print,
+    report_error=functools.partial(print, file=sys.stderr),
+    stats=None,
+):
+    """Run hooks on a single file
+
+    fix enables namespell fixes, check makes replace-hyphen-like only report
+    the characters, like the options of the separate hooks. Returns a tuple
+    of namespell result (True if passed) and replace-hyphen-like result
+    (1 if the file was modified, the characters were found or the file
+    couldn't be processed, 0 otherwise).
+    """
+    with open(filename, "rb") as file:
+        data = file.read()
+    if stats is not None:
+        stats.bytes += len(data)
+    replace_hyphens = "replace-hyphen-like" in hooks and hyphen_files.search(filename)
+    hyphen_result = 0
+    # (report function, message) of replace-hyphen-like, reported after
+    # namespell like when the hooks are run one by one
+    hyphen_reports = []
+    try:
+        text = data.decode("utf-8")
+    except UnicodeDecodeError as e:
+        # namespell reads such files anyway, replace-hyphen-like refuses to
+        text = data.decode("utf-8", errors="ignore")
+        if replace_hyphens:
+            hyphen_reports.append((report_error, f"Error processing {filename}: {e}"))
+            replace_hyphens = False
+            hyphen_result = 1
+    if replace_hyphens and contains_hyphen_like(data):
+        for line, column, name in find_hyphen_like(data):
+            if stats is not None:
+                stats.matches[name] += 1
+            if check:
+                message = f"{filename}:{line}:{column}: {name} should be HYPHEN-MINUS"
+                hyphen_reports.append((report, message))
+        hyphen_result = 1
+    else:
+        replace_hyphens = False
+
+    fixed_text = text
+    passed = True
+    if "namespell" in hooks:
+        lines = []
+        passed = namespell.check_lines(
+            filename,
+            # Split lines like a file opened in text mode does, but keep
+            # line endings
+            io.StringIO(text, newline=""),
+            autofix=fix,
+            report=report,
+            write=lines.append if fix else None,
+            matcher=matcher,
+            stats=stats,
+        )
+        if fix and not passed:
+            fixed_text = "".join(lines)
+    elif stats is not None:
+        stats.lines += count_newlines(data)
+    for report_hyphens, message in hyphen_reports:
+        report_hyphens(message)
+    if replace_hyphens and not check:
+        fixed_text = replace_in_text(fixed_text)
+
+    if fixed_text != text:
+        with AtomicWriter(filename, "wb") as writer:
+            writer.file.write(fixed_text.encode("utf-8"))
+            writer.commit()
+        if replace_hyphens and not check:
+            report(f"Fixed hyphen-like characters in: {filename}")
+    return passed, hyphen_result
+
+
+@functools.lru_cache(maxsize=None)
+def __worker_matcher(config, cache_dir):
+    return namespell.load_matcher(config, cache_dir)
+
+
+# Worker entry point, output is collected and printed by the parent process
+# so it doesn't depend on the order in which the workers finish
+def __run_collect(
+    filename,
+    hooks=(),
+    fix=False,
+    check=False,
+    hyphen_files=HYPHEN_FILES,
+    config=(),
+    cache_dir=None,
+    collect_stats=False,
+):
+    output = []
+    file_stats = FileStats(filename) if collect_stats else None
+    with timed(file_stats):
+        try:
+            result = run_file(
+                filename,
+                hooks,
+                fix,
+                check,
+                re.compile(hyphen_files),
+                __worker_matcher(config, cache_dir),
+                lambda message: output.append((False, message)),
+                lambda message: output.append((True, message)),
+                file_stats,
+            )
+        except OSError as e:
+            output.append((True, f"Error processing {filename}: {e}"))
+            result = (False, 1)
+    return result, output, file_stats
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="3mdeb hooks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    run_parser = subparsers.add_parser(
+        "run",
+        help="Run several hooks reading each file once",
+        description="Run several hooks reading each file once",
+    )
+    run_parser.add_argument("files", nargs="*", help="Files or directories to process")
+    run_parser.add_argument(
+        "--hooks",
+        type=hooks_type,
+        default=HOOKS,
+        metavar="HOOK[,HOOK...]",
+        help=f"Hooks to run (default: {','.join(HOOKS)})",
+    )
+    run_parser.add_argument(
+        "--disable",
+        type=hooks_type,
+        action="extend",
+        default=[],
+        metavar="HOOK[,HOOK...]",
+        help="Don't run these hooks",
+    )
+    run_parser.add_argument(
+        "-f",
+        "--fix",
+        action="store_true",
+        default=False,
+        help="Automatically fix namespell issues",
+    )
+    run_parser.add_argument(
+        "--check",
+        action="store_true",
+        default=False,
+        help="Only report hyphen-like characters, don't replace them",
+    )
+    run_parser.add_argument(
+        "--hyphen-files",
+        default=HYPHEN_FILES,
+        metavar="REGEX",
+        help=f"Files replace-hyphen-like is run on (default: {HYPHEN_FILES})",
+    )
+    run_parser.add_argument(
+        "--rules",
+        action="append",
+        default=[],
+        metavar="FILE",
+        help="Additional namespell rule dictionary",
+    )
+    run_parser.add_argument(
+        "--cache-dir",
+        default=namespell.DEFAULT_CACHE_DIR,
+        help="Directory of the compiled namespell rules "
+        f"(default: {namespell.DEFAULT_CACHE_DIR})",
+    )
+    add_jobs_argument(run_parser)
+    discovery.add_arguments(run_parser)
+    add_arguments(run_parser)
+    args = parser.parse_args()
+    try:
+        re.compile(args.hyphen_files)
+    except re.error as e:
+        run_parser.error(f"invalid --hyphen-files: {e}")
+    return args
+
+
+def main():
+    args = parse_args()
+    hooks = [hook for hook in args.hooks if hook not in args.disable]
+    with instrument("3mdeb-hooks run", args) as stats:
+        config = tuple(namespell.find_config_files(args.rules))
+        try:
+            # Loaded here to report configuration errors once, serial runs
+            # then reuse it
+            __worker_matcher(config, args.cache_dir)
+        except namespell.ConfigError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+        process = functools.partial(
+            __run_collect,
+            hooks=tuple(hooks),
+            fix=args.fix,
+            check=args.check,
+            hyphen_files=args.hyphen_files,
+            config=config,
+            cache_dir=args.cache_dir,
+            collect_stats=stats is not None,
+        )
+        all_passed = True
+        modified_count = 0
+        files = discovery.discover(
+            args, namespell.EXTENSIONS + discovery.MARKDOWN_EXTENSIONS, stats
+        )
+        for (passed, modified), output, file_stats in imap_ordered(
+            process, files, args.jobs
+        ):
+            for is_error, message in output:
+                print(message, file=sys.stderr if is_error else sys.stdout)
+            if file_stats is not None:
+                stats.add(file_stats)
+            all_passed = all_passed and passed
+            modified_count += modified
+
+        # Summary of replace-hyphen-like, same as the separate hook prints
+        if modified_count > 0:
+            if args.check:
+                print(f"Found hyphen-like characters in {modified_count} file(s)")
+            else:
+                print(f"Modified {modified_count} file(s)")
+        if not all_passed or modified_count > 0:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
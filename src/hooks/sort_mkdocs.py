@@ -1,4 +1,27 @@
+import argparse
+import functools
+import itertools
+import os
+import re
 import sys
+from typing import List, Tuple
+
+from hooks import discovery
+from hooks.fileio import AtomicWriter
+from hooks.parallel import add_jobs_argument, imap_ordered
+from hooks.stats import FileStats, add_arguments, instrument, timed
+
+DEFAULT_FILE = "mkdocs.yml"
+# Files sorted in directories given on the command line
+EXTENSIONS = (".yml", ".yaml")
+DEFAULT_START_MARKER = "#pre-commit-sort-start"
+DEFAULT_END_MARKER = "#pre-commit-sort-end"
+NAV_START = re.compile(r"nav:\s*(#.*)?$")
+NUMBER = re.compile(r"(\d+)")
+
+
+class SortError(Exception):
+    """Markers in a file don't form valid sections"""
 
 
 def section_idxs_to_lines(section):
@@ -10,9 +33,10 @@ def check_sections_order(sections):
     for section in sections:
         if section[1] < section[0]:
             section = section_idxs_to_lines(section)
-            print("End marker has to be placed after a start marker")
-            print(f"End marker at {section[0]}, start marker at {section[1]}")
-            exit(1)
+            raise SortError(
+                "End marker has to be placed after a start marker\n"
+                f"End marker at {section[1]}, start marker at {section[0]}"
+            )
 
 
 def check_sections_overlap(sections):
@@ -20,63 +44,346 @@ def check_sections_overlap(sections):
         previous_end = sections[i - 1][1]
         next_start = sections[i][0]
         if next_start < previous_end:
-            print("Sections to sort can't overlap")
             section_a = section_idxs_to_lines(sections[i - 1])
             section_b = section_idxs_to_lines(sections[i])
-            print(f"Section {section_a} overlaps with {section_b}")
-            exit(1)
+            raise SortError(
+                "Sections to sort can't overlap\n"
+                f"Section {section_a} overlaps with {section_b}"
+            )
 
 
-def main():
-    """Sorts sections of a file marked by special markers passed as arguments
-    Usage:
-        <executable> [file-name] "[start-marker]" "[end-marker]"
-    """
-    file_path = "mkdocs.yml"
-    start_marker = "#pre-commit-sort-start"
-    end_marker = "#pre-commit-sort-end"
-    # Read args
-    if len(sys.argv) >= 2:
-        file_path = sys.argv[1]
-    if len(sys.argv) >= 3:
-        start_marker = sys.argv[2]
-    if len(sys.argv) >= 4:
-        end_marker = sys.argv[3]
-
-    # Find sections in file
-    with open(file_path, "r") as file:
-        lines = file.read().splitlines()
-    start_lines = [idx for idx, s in enumerate(lines) if start_marker in s]
-    end_lines = [idx for idx, s in enumerate(lines) if end_marker in s]
-    sections_to_sort = list(zip(start_lines, end_lines))
-
-    # Input validation
-    if not len(start_lines) > 0:
-        print(f'No start markers found in the file. Expected marker: "{start_marker}"')
-        exit(1)
+def find_sections(lines, start_marker, end_marker) -> List[Tuple[int, int]]:
+    """(start, end) indices of marker lines of all sections, found in one pass"""
+    start_lines = []
+    end_lines = []
+    for idx, line in enumerate(lines):
+        if start_marker in line:
+            start_lines.append(idx)
+        if end_marker in line:
+            end_lines.append(idx)
+
+    if not start_lines:
+        raise SortError(
+            f'No start markers found in the file. Expected marker: "{start_marker}"'
+        )
     if len(start_lines) != len(end_lines):
-        print(
+        raise SortError(
             f"Number of start markers (lines: {start_lines}) does not equal number of end markers (lines: {end_lines})"
         )
-        exit(1)
-    check_sections_order(sections_to_sort)
-    check_sections_overlap(sections_to_sort)
+    sections = list(zip(start_lines, end_lines))
+    check_sections_order(sections)
+    check_sections_overlap(sections)
+    return sections
+
 
-    # Sorting
+def sort_sections(lines, sections) -> bool:
+    """Sort lines between markers in place, returns True if any moved"""
     changed = False
-    for start_idx, end_idx in zip(start_lines, end_lines):
+    for start_idx, end_idx in sections:
         to_sort = lines[start_idx + 1 : end_idx]
         to_sort.sort()
         if lines[start_idx + 1 : end_idx] != to_sort:
             changed = True
-        lines[start_idx + 1 : end_idx] = to_sort
-
-    # Write changes
-    if changed:
-        with open(file_path, "w") as file:
-            file.writelines([line + "\n" for line in lines])
-        exit(1)
-    exit(0)
+            lines[start_idx + 1 : end_idx] = to_sort
+    return changed
+
+
+def sections_sorted(lines, sections) -> bool:
+    """Check if lines between markers are sorted without sorting them"""
+    for start_idx, end_idx in sections:
+        for idx in range(start_idx + 2, end_idx):
+            if lines[idx] < lines[idx - 1]:
+                return False
+    return True
+
+
+def nav_title(item) -> str:
+    """Title of a nav entry, its path if it has no title"""
+    text = item.strip()[1:].strip()
+    if text[:1] in ("'", '"'):
+        end = text.find(text[0], 1)
+        if end != -1:
+            return text[1:end]
+    text = text.split(" #", 1)[0].rstrip()
+    title, separator, _ = text.partition(": ")
+    if separator:
+        return title
+    return text[:-1] if text.endswith(":") else text
+
+
+def nav_sort_key(item, natural=False):
+    """Case-folded title, with numbers compared by value if natural is set"""
+    title = nav_title(item).casefold()
+    if not natural:
+        return title
+    # Numbers are always at odd indices, so only str is compared with str
+    # and int with int
+    return tuple(
+        int(part) if idx % 2 else part for idx, part in enumerate(NUMBER.split(title))
+    )
+
+
+class NavEntry:
+    __slots__ = ("key", "head", "children")
+
+    def __init__(self, key, head):
+        self.key = key
+        # Comments and blank lines preceding the entry, the entry line and
+        # its continuation lines
+        self.head = head
+        self.children = []
+
+
+class NavTree:
+    """Indented YAML list (e.g. mkdocs nav) parsed into a tree of entries
+
+    Comments and blank lines move with the entry following them, so sorting
+    keeps them together. Sort keys are computed once, when parsing. Parsing,
+    checking and serializing are O(n), sorting O(n log n).
+    """
+
+    def __init__(self, lines, natural=False):
+        self.entries = []
+        # Lists of siblings, for sorting and checking without recursion
+        self.sibling_lists = [self.entries]
+        # (indent, children list, entry) of the open entries
+        stack = [(-1, self.entries, None)]
+        pending = []
+        for line in lines:
+            stripped = line.lstrip()
+            if not stripped or stripped.startswith("#"):
+                pending.append(line)
+                continue
+            indent = len(line) - len(stripped)
+            if stripped == "-" or stripped.startswith("- "):
+                while stack[-1][0] >= indent:
+                    stack.pop()
+                entry = NavEntry(nav_sort_key(line, natural), pending + [line])
+                pending = []
+                stack[-1][1].append(entry)
+                self.sibling_lists.append(entry.children)
+                stack.append((indent, entry.children, entry))
+            elif stack[-1][2] is not None:
+                # Continuation of the last entry, e.g. a multi-line value
+                stack[-1][2].head.extend(pending + [line])
+                pending = []
+            else:
+                raise SortError(f"Not a list entry: {line.strip()}")
+        # Comments after the last entry stay at the end
+        self.tail = pending
+
+    def is_sorted(self) -> bool:
+        for siblings in self.sibling_lists:
+            for idx in range(1, len(siblings)):
+                if siblings[idx].key < siblings[idx - 1].key:
+                    return False
+        return True
+
+    def sort(self):
+        for siblings in self.sibling_lists:
+            siblings.sort(key=lambda entry: entry.key)
+
+    def lines(self) -> List[str]:
+        output = []
+        stack = [iter(self.entries)]
+        while stack:
+            entry = next(stack[-1], None)
+            if entry is None:
+                stack.pop()
+                continue
+            output.extend(entry.head)
+            if entry.children:
+                stack.append(iter(entry.children))
+        output.extend(self.tail)
+        return output
+
+
+def find_nav_section(lines) -> Tuple[int, int]:
+    """(start, end) indices of the line starting nav block and the line after it"""
+    for start_idx, line in enumerate(lines):
+        if NAV_START.match(line):
+            break
+    else:
+        raise SortError("No nav section found in the file")
+    end_idx = start_idx + 1
+    while end_idx < len(lines):
+        line = lines[end_idx]
+        # Top level list items may be indented as much as the nav key
+        if line and line[0] not in (" ", "\t", "#", "-"):
+            break
+        end_idx += 1
+    return start_idx, end_idx
+
+
+def sort_file(
+    file_path,
+    start_marker=DEFAULT_START_MARKER,
+    end_marker=DEFAULT_END_MARKER,
+    stats=None,
+    nav=False,
+    natural=False,
+    check=False,
+) -> bool:
+    """Sort sections of a file, returns True if the file was modified
+
+    With nav set, sections are sorted as trees of nested list entries
+    (siblings are ordered by case-folded titles, natural sets numbers to be
+    compared by value) and the whole nav block is sorted if there are no
+    markers. With check set the file is only checked, True is returned if
+    it isn't sorted. The file is atomically replaced only if the order of
+    any lines changed. Raises SortError if the markers don't form valid
+    sections.
+    """
+    with open(file_path, "r") as file:
+        lines = file.read().splitlines()
+    if stats is not None:
+        stats.bytes = os.path.getsize(file_path)
+        stats.lines = len(lines)
+    if nav and not any(start_marker in line for line in lines):
+        sections = [find_nav_section(lines)]
+    else:
+        sections = find_sections(lines, start_marker, end_marker)
+    if stats is not None:
+        stats.matches["sections"] = len(sections)
+
+    if not nav:
+        if check:
+            return not sections_sorted(lines, sections)
+        if not sort_sections(lines, sections):
+            return False
+    else:
+        trees = [
+            NavTree(lines[start_idx + 1 : end_idx], natural)
+            for start_idx, end_idx in sections
+        ]
+        if all(tree.is_sorted() for tree in trees):
+            return False
+        if check:
+            return True
+        # Replace from the end, so indices of earlier sections stay valid
+        for (start_idx, end_idx), tree in reversed(list(zip(sections, trees))):
+            tree.sort()
+            lines[start_idx + 1 : end_idx] = tree.lines()
+    with AtomicWriter(file_path) as writer:
+        writer.file.writelines([line + "\n" for line in lines])
+        writer.commit()
+    return True
+
+
+# Worker entry point, returns (modified, error message or None, statistics)
+def __sort_collect(
+    file_path,
+    start_marker,
+    end_marker,
+    nav=False,
+    natural=False,
+    check=False,
+    collect_stats=False,
+):
+    file_stats = FileStats(file_path) if collect_stats else None
+    with timed(file_stats):
+        try:
+            return (
+                sort_file(
+                    file_path,
+                    start_marker,
+                    end_marker,
+                    file_stats,
+                    nav,
+                    natural,
+                    check,
+                ),
+                None,
+                file_stats,
+            )
+        except (OSError, UnicodeDecodeError, SortError) as e:
+            return False, str(e), file_stats
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Sort sections of files marked by start and end markers",
+        epilog="The legacy form '<file> <start-marker> <end-marker>' is still "
+        "accepted.",
+    )
+    parser.add_argument(
+        "files",
+        nargs="*",
+        help=f"Files or directories to sort (default: {DEFAULT_FILE})",
+    )
+    parser.add_argument(
+        "--start-marker",
+        default=DEFAULT_START_MARKER,
+        help=f"Line marking start of a section (default: {DEFAULT_START_MARKER})",
+    )
+    parser.add_argument(
+        "--end-marker",
+        default=DEFAULT_END_MARKER,
+        help=f"Line marking end of a section (default: {DEFAULT_END_MARKER})",
+    )
+    parser.add_argument(
+        "--nav",
+        action="store_true",
+        default=False,
+        help="Sort nested list entries (e.g. mkdocs nav) as a tree by their "
+        "titles, the whole nav block is sorted if there are no markers",
+    )
+    parser.add_argument(
+        "--natural",
+        action="store_true",
+        default=False,
+        help="With --nav, compare numbers in titles by value (2 before 10)",
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        default=False,
+        help="Only check if the files are sorted, don't modify them",
+    )
+    add_jobs_argument(parser)
+    discovery.add_arguments(parser)
+    add_arguments(parser)
+    args = parser.parse_args()
+    if not args.files:
+        args.files = [DEFAULT_FILE]
+    # Markers used to be passed as the 2nd and 3rd positional argument
+    if len(args.files) == 3 and not any(map(os.path.exists, args.files[1:])):
+        args.files, args.start_marker, args.end_marker = args.files[:1], *args.files[1:]
+    return args
+
+
+def main():
+    """Sorts sections of files marked by special markers
+    Usage:
+        <executable> [file-name...] [--start-marker MARKER] [--end-marker MARKER]
+    """
+    args = parse_args()
+    with instrument("sort-mkdocs", args) as stats:
+        process = functools.partial(
+            __sort_collect,
+            start_marker=args.start_marker,
+            end_marker=args.end_marker,
+            nav=args.nav,
+            natural=args.natural,
+            check=args.check,
+            collect_stats=stats is not None,
+        )
+        # Errors name the file unless a single file was given
+        name_files = len(args.files) > 1 or os.path.isdir(args.files[0])
+        files, to_process = itertools.tee(discovery.discover(args, EXTENSIONS, stats))
+        failed = False
+        for file_path, (modified, error, file_stats) in zip(
+            files, imap_ordered(process, to_process, args.jobs)
+        ):
+            if file_stats is not None:
+                stats.add(file_stats)
+            if error is not None:
+                print(f"{file_path}: {error}" if name_files else error)
+            elif modified and args.check:
+                print(f"{file_path} is not sorted")
+            if modified or error is not None:
+                failed = True
+        sys.exit(1 if failed else 0)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,165 @@
+"""Statistics and profiling shared by the hook entry points
+
+Every hook accepts --stats (human readable summary on stderr), --stats-json
+FILE (the same data as JSON, e.g. to chart it in CI) and --profile FILE
+(cProfile data of the main process, readable with pstats or snakeviz).
+"""
+
+import cProfile
+import json
+import sys
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+
+class FileStats:
+    """Statistics of a single processed item (usually a file)"""
+
+    def __init__(self, name):
+        self.name = name
+        self.seconds = 0.0
+        self.bytes = 0
+        self.lines = 0
+        self.matches = Counter()
+        # Reason why the item wasn't processed, if it wasn't
+        self.skipped = None
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "seconds": round(self.seconds, 6),
+            "bytes": self.bytes,
+            "lines": self.lines,
+            "matches": dict(self.matches),
+            "skipped": self.skipped,
+        }
+
+
+class Stats:
+    """Collects FileStats of a hook run"""
+
+    def __init__(self, hook):
+        self.hook = hook
+        self.files = []
+        self.start = time.perf_counter()
+
+    @contextmanager
+    def measure(self, name):
+        """Time the body and record the yielded FileStats"""
+        file_stats = FileStats(name)
+        try:
+            with timed(file_stats):
+                yield file_stats
+        finally:
+            self.files.append(file_stats)
+
+    def add(self, file_stats):
+        """Record FileStats measured elsewhere (e.g. in a worker process)"""
+        self.files.append(file_stats)
+
+    def skip(self, name, reason):
+        file_stats = FileStats(name)
+        file_stats.skipped = reason
+        self.files.append(file_stats)
+
+    def summary(self) -> dict:
+        matches = Counter()
+        for file_stats in self.files:
+            matches.update(file_stats.matches)
+        return {
+            "hook": self.hook,
+            "seconds": round(time.perf_counter() - self.start, 6),
+            "files": len(self.files),
+            "files_skipped": sum(1 for f in self.files if f.skipped is not None),
+            "bytes": sum(f.bytes for f in self.files),
+            "lines": sum(f.lines for f in self.files),
+            "matches": dict(matches),
+            "per_file": [f.to_dict() for f in self.files],
+        }
+
+    def print(self, stream=sys.stderr):
+        summary = self.summary()
+        print(f"\n{self.hook} statistics:", file=stream)
+        for file_stats in sorted(self.files, key=lambda f: f.seconds, reverse=True):
+            if file_stats.skipped is not None:
+                details = f"skipped ({file_stats.skipped})"
+            else:
+                details = (
+                    f"{file_stats.seconds * 1000:9.2f} ms "
+                    f"{file_stats.bytes:>10} B {file_stats.lines:>8} lines"
+                )
+            print(f"  {details}  {file_stats.name}", file=stream)
+        print(
+            f"Total: {summary['seconds']:.3f} s, {summary['files']} file(s) "
+            f"({summary['files_skipped']} skipped), {summary['bytes']} B, "
+            f"{summary['lines']} lines",
+            file=stream,
+        )
+        for name, count in sorted(summary["matches"].items()):
+            print(f"  {name}: {count} match(es)", file=stream)
+
+
+@contextmanager
+def timed(file_stats):
+    """Add wall time of the body to file_stats, which may be None"""
+    start = time.perf_counter()
+    try:
+        yield file_stats
+    finally:
+        if file_stats is not None:
+            file_stats.seconds += time.perf_counter() - start
+
+
+@contextmanager
+def measure(stats, name):
+    """Stats.measure which yields None if stats aren't collected"""
+    if stats is None:
+        yield None
+    else:
+        with stats.measure(name) as file_stats:
+            yield file_stats
+
+
+def add_arguments(parser):
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        default=False,
+        help="Print per-file statistics to stderr",
+    )
+    parser.add_argument(
+        "--stats-json", metavar="FILE", help="Write statistics as JSON to FILE"
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="FILE",
+        help="Write cProfile data of the main process to FILE",
+    )
+
+
+@contextmanager
+def instrument(hook, args):
+    """Wrap a hook run according to the arguments from add_arguments
+
+    Yields a Stats instance when statistics were requested or None, so hooks
+    can skip collecting them otherwise. Outputs are written even if the body
+    exits with sys.exit().
+    """
+    stats = Stats(hook) if args.stats or args.stats_json else None
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield stats
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+        if stats is not None:
+            if args.stats:
+                stats.print()
+            if args.stats_json:
+                with open(args.stats_json, "w") as file:
+                    json.dump(stats.summary(), file, indent=2)
+                    file.write("\n")
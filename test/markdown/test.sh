@@ -0,0 +1,70 @@
+#!/usr/bin/env bash
+# Tests markdown.sh batching with a fake docker, no container is run:
+#   ./test/markdown/test.sh
+
+TEST_DIR="$(dirname "$(readlink -f "$0")")"
+MARKDOWN_SH="$(dirname "$(dirname "$TEST_DIR")")/markdown.sh"
+WORK_DIR="$(mktemp -d)"
+trap 'rm -rf "$WORK_DIR"' EXIT
+export PATH="$TEST_DIR:$PATH"
+export FAKE_DOCKER_LOG="$WORK_DIR/docker.log"
+export HOME="$WORK_DIR/home"
+export GIT_CONFIG_GLOBAL=/dev/null
+FAILED=0
+
+fail() {
+  echo "FAIL: $1"
+  FAILED=1
+}
+
+# Runs markdown.sh, stores its output in OUTPUT and exit code in STATUS
+run() {
+  : >"$FAKE_DOCKER_LOG"
+  OUTPUT="$("$MARKDOWN_SH" "$@" 2>&1)"
+  STATUS=$?
+}
+
+mkdir -p "$HOME" "$WORK_DIR/repo/docs/sub" "$WORK_DIR/other/docs" "$WORK_DIR/loose"
+git init -q "$WORK_DIR/repo"
+git init -q "$WORK_DIR/other"
+echo "fine" >"$WORK_DIR/repo/docs/a.md"
+echo "BAD line" >"$WORK_DIR/repo/docs/sub/b.md"
+echo "fine" >"$WORK_DIR/repo/docs/c.markdown"
+echo "BAD" >"$WORK_DIR/repo/docs/skipped.txt"
+echo "fine" >"$WORK_DIR/other/docs/d.md"
+echo "fine" >"$WORK_DIR/loose/e.md"
+
+run check "$WORK_DIR/repo/docs"
+[ "$STATUS" -eq 1 ] || fail "check: exit code $STATUS instead of 1"
+[ "$(grep -c '^run' "$FAKE_DOCKER_LOG")" -eq 1 ] || fail "check: not a single run"
+grep -q "^run 3$" "$FAKE_DOCKER_LOG" || fail "check: not all files linted at once"
+grep -q "mount $WORK_DIR/repo:/workdir:ro$" "$FAKE_DOCKER_LOG" ||
+  fail "check: repository not mounted read-only"
+[ "$OUTPUT" = "docs/sub/b.md:1:BAD line" ] || fail "check: output '$OUTPUT'"
+
+run -j 2 check "$WORK_DIR/repo/docs"
+[ "$STATUS" -eq 1 ] || fail "-j 2: exit code $STATUS instead of 1"
+[ "$(grep -c '^run' "$FAKE_DOCKER_LOG")" -eq 2 ] || fail "-j 2: not two runs"
+
+# Files from several repositories and outside of any, their common root
+# ($WORK_DIR) must never be mounted
+run -j 2 fix "$WORK_DIR/repo/docs/sub/b.md" "$WORK_DIR/other" "$WORK_DIR/loose/e.md"
+[ "$STATUS" -eq 1 ] || fail "fix: exit code $STATUS instead of 1"
+grep -q "mount $WORK_DIR:" "$FAKE_DOCKER_LOG" && fail "fix: common root mounted"
+grep -q "mount /:" "$FAKE_DOCKER_LOG" && fail "fix: / mounted"
+for root in "$WORK_DIR/repo" "$WORK_DIR/other" "$WORK_DIR/loose"; do
+  grep -q "mount $root:/workdir:rw$" "$FAKE_DOCKER_LOG" ||
+    fail "fix: $root not mounted"
+done
+grep -q BAD "$WORK_DIR/repo/docs/sub/b.md" && fail "fix: file not fixed"
+
+run check "$WORK_DIR/repo/docs"
+[ "$STATUS" -eq 0 ] || fail "after fix: exit code $STATUS instead of 0"
+
+run check "$WORK_DIR/missing.md"
+[ "$STATUS" -eq 1 ] || fail "missing file: exit code $STATUS instead of 1"
+
+if [ "$FAILED" -eq 0 ]; then
+  echo "OK"
+fi
+exit "$FAILED"
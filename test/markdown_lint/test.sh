@@ -0,0 +1,57 @@
+#!/usr/bin/env bash
+# Tests markdown-lint against fixtures with the repository's configuration:
+#   ./test/markdown_lint/test.sh
+#
+# cases/*.md have to produce expected.txt, the same files fixed with --fix
+# have to match fixed/*.md and report expected-fix.txt, and the namespell
+# fixtures in src/hooks/test have to pass. If markdownlint-cli
+# (markdownlint) is installed, expected.txt is also compared with its
+# output limited to the rules markdown-lint implements.
+
+TEST_DIR="$(dirname "$(readlink -f "$0")")"
+REPO_DIR="$(dirname "$(dirname "$TEST_DIR")")"
+CONFIG="$REPO_DIR/.markdownlint.yaml"
+WORK_DIR="$(mktemp -d)"
+trap 'rm -rf "$WORK_DIR"' EXIT
+export PYTHONPATH="$REPO_DIR/src${PYTHONPATH:+:$PYTHONPATH}"
+FAILED=0
+
+fail() {
+  echo "FAIL: $1"
+  FAILED=1
+}
+
+markdownLint() {
+  python3 -m hooks.markdown_lint -c "$CONFIG" "$@" 2>&1
+}
+
+cd "$TEST_DIR" || exit 1
+markdownLint cases/*.md >"$WORK_DIR/check.txt"
+diff -u expected.txt "$WORK_DIR/check.txt" || fail "check output differs"
+
+cp -r cases "$WORK_DIR/cases"
+(cd "$WORK_DIR" && markdownLint --fix cases/*.md) >"$WORK_DIR/fix.txt"
+diff -u expected-fix.txt "$WORK_DIR/fix.txt" || fail "fix output differs"
+for fixed in fixed/*.md; do
+  diff -u "$fixed" "$WORK_DIR/cases/$(basename "$fixed")" ||
+    fail "$(basename "$fixed") fixed differently"
+done
+
+(cd "$REPO_DIR/src/hooks/test" && markdownLint ./*.md) >"$WORK_DIR/fixtures.txt" ||
+  fail "src/hooks/test fixtures: $(cat "$WORK_DIR/fixtures.txt")"
+
+if command -v markdownlint >/dev/null; then
+  RULES="$(python3 -c 'from hooks.markdown_lint import RULE_CODES
+print("|".join(RULE_CODES))')"
+  markdownlint -c "$CONFIG" cases/*.md 2>&1 | grep -E " ($RULES)/" |
+    sort >"$WORK_DIR/markdownlint.txt"
+  sort expected.txt | diff -u - "$WORK_DIR/markdownlint.txt" ||
+    fail "expected.txt differs from markdownlint-cli"
+else
+  echo "markdownlint-cli not installed, skipping the comparison with it"
+fi
+
+if [ "$FAILED" -eq 0 ]; then
+  echo "OK"
+fi
+exit "$FAILED"
@@ -0,0 +1,47 @@
+#!/usr/bin/env bash
+# Tests patches written by namespell --diff-output:
+#   ./test/namespell/test.sh
+#
+# Patches have to apply with git apply and give the fixed files, whatever
+# the line endings of the files are.
+
+TEST_DIR="$(dirname "$(readlink -f "$0")")"
+REPO_DIR="$(dirname "$(dirname "$TEST_DIR")")"
+WORK_DIR="$(mktemp -d)"
+trap 'rm -rf "$WORK_DIR"' EXIT
+export PYTHONPATH="$REPO_DIR/src${PYTHONPATH:+:$PYTHONPATH}"
+export HOME="$WORK_DIR/home"
+export GIT_CONFIG_GLOBAL=/dev/null
+FAILED=0
+
+fail() {
+  echo "FAIL: $1"
+  FAILED=1
+}
+
+# diffCase name content expected: writes content to name.md, applies the
+# patch written by --diff-output and compares the result with expected
+diffCase() {
+  printf "%b" "$2" >"$WORK_DIR/repo/$1.md"
+  printf "%b" "$3" >"$WORK_DIR/$1.expected"
+  (cd "$WORK_DIR/repo" &&
+    python3 -m hooks.namespell --no-cache --diff-output "../$1.diff" "$1.md") \
+    >/dev/null && fail "$1: check passed"
+  (cd "$WORK_DIR/repo" && git apply "../$1.diff") ||
+    fail "$1: patch doesn't apply"
+  cmp -s "$WORK_DIR/repo/$1.md" "$WORK_DIR/$1.expected" ||
+    fail "$1: patched file differs"
+}
+
+mkdir -p "$HOME" "$WORK_DIR/repo"
+git init -q "$WORK_DIR/repo"
+
+diffCase lf "Intro\nWe use zarhus here.\nText\n" "Intro\nWe use Zarhus here.\nText\n"
+diffCase crlf "Intro\r\nWe use zarhus here.\r\nmid\r\nand dasharo\r\n" \
+  "Intro\r\nWe use Zarhus here.\r\nmid\r\nand Dasharo\r\n"
+diffCase no_eol "Intro\r\nWe use zarhus here." "Intro\r\nWe use Zarhus here."
+
+if [ "$FAILED" -eq 0 ]; then
+  echo "OK"
+fi
+exit "$FAILED"
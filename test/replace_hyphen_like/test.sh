@@ -0,0 +1,73 @@
+#!/usr/bin/env bash
+# Tests replace-hyphen-like on memory-mapped (large) files:
+#   ./test/replace_hyphen_like/test.sh
+
+TEST_DIR="$(dirname "$(readlink -f "$0")")"
+REPO_DIR="$(dirname "$(dirname "$TEST_DIR")")"
+WORK_DIR="$(mktemp -d)"
+trap 'rm -rf "$WORK_DIR"' EXIT
+export PYTHONPATH="$REPO_DIR/src${PYTHONPATH:+:$PYTHONPATH}"
+FAILED=0
+
+fail() {
+  echo "FAIL: $1"
+  FAILED=1
+}
+
+# The prefilter on an mmap has to find the characters anywhere and has to
+# search at C speed, "lead_byte in mmap" took about 0.5s per lead byte here
+python3 - "$WORK_DIR" <<'EOF' || fail "prefilter on mmap"
+import mmap
+import os
+import sys
+import time
+
+from hooks.replace_hyphen_like import MMAP_THRESHOLD, contains_hyphen_like
+
+size = MMAP_THRESHOLD + 1024 * 1024
+cases = {
+    "clean": b"a" * size,
+    "end": b"a" * (size - 3) + "—".encode(),
+    # Lead byte of a hyphen-like character, but another character
+    "lead-only": b"a" * (size - 3) + " ".encode(),
+}
+failed = False
+for name, content in cases.items():
+    path = os.path.join(sys.argv[1], name)
+    with open(path, "wb") as file:
+        file.write(content)
+    with open(path, "rb") as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            start = time.perf_counter()
+            found = contains_hyphen_like(data)
+            elapsed = time.perf_counter() - start
+    if found != (name == "end"):
+        print(f"{name}: contains_hyphen_like() returned {found}")
+        failed = True
+    if elapsed > 0.2:
+        print(f"{name}: contains_hyphen_like() took {elapsed:.2f}s")
+        failed = True
+    os.remove(path)
+sys.exit(1 if failed else 0)
+EOF
+
+# A large file is memory-mapped by the hook, fixed and reported
+python3 -c "
+import sys
+from hooks.replace_hyphen_like import MMAP_THRESHOLD
+line = 'plain text\n'
+sys.stdout.write(line * (MMAP_THRESHOLD // len(line) + 1) + 'text — text\n')
+" >"$WORK_DIR/large.md"
+LINE="$(wc -l <"$WORK_DIR/large.md")"
+OUTPUT="$(python3 -m hooks.replace_hyphen_like --check "$WORK_DIR/large.md")"
+[ "$(echo "$OUTPUT" | head -1)" = \
+  "$WORK_DIR/large.md:$LINE:6: EM DASH should be HYPHEN-MINUS" ] ||
+  fail "check of a large file: $OUTPUT"
+python3 -m hooks.replace_hyphen_like "$WORK_DIR/large.md" >/dev/null &&
+  fail "fixing a large file didn't fail"
+grep -q $'—' "$WORK_DIR/large.md" && fail "large file wasn't fixed"
+
+if [ "$FAILED" -eq 0 ]; then
+  echo "OK"
+fi
+exit "$FAILED"
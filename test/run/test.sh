@@ -0,0 +1,34 @@
+#!/usr/bin/env bash
+# Tests that 3mdeb-hooks run reports like the hooks run one by one:
+#   ./test/run/test.sh
+
+TEST_DIR="$(dirname "$(readlink -f "$0")")"
+REPO_DIR="$(dirname "$(dirname "$TEST_DIR")")"
+WORK_DIR="$(mktemp -d)"
+trap 'rm -rf "$WORK_DIR"' EXIT
+export PYTHONPATH="$REPO_DIR/src${PYTHONPATH:+:$PYTHONPATH}"
+FAILED=0
+
+fail() {
+  echo "FAIL: $1"
+  FAILED=1
+}
+
+cd "$WORK_DIR" || exit 1
+# Both files trigger both hooks, namespell has to report first
+printf "Text — zarhus\nand dasharo – here\n" >a.md
+printf "zarhus\nOne − two\n" >b.md
+
+python3 -m hooks.run run --check a.md b.md >run.txt 2>&1 &&
+  fail "run --check passed"
+for file in a.md b.md; do
+  python3 -m hooks.namespell --no-cache "$file"
+  python3 -m hooks.replace_hyphen_like --check "$file" | grep -v "^Found"
+done >separate.txt 2>&1
+echo "Found hyphen-like characters in 2 file(s)" >>separate.txt
+diff -u separate.txt run.txt || fail "run --check output order differs"
+
+if [ "$FAILED" -eq 0 ]; then
+  echo "OK"
+fi
+exit "$FAILED"